@@ -0,0 +1,264 @@
+"""
+Throughput benchmarks for the cytotransform transforms.
+
+Every combination of transform, direction (forward/inverse), input type (ndarray/DataFrame), number of
+events, number of channels and executor is run in a fresh subprocess, so that the peak RSS reported is
+that of the case alone. Results are written to JSON, so that runs on one machine can be compared
+across commits:
+
+    python -m benchmarks.run_benchmarks --output before.json
+    git checkout my-branch
+    python -m benchmarks.run_benchmarks --output after.json --compare before.json
+
+Run from the repository root to benchmark the working tree, or from anywhere else to benchmark the
+installed package. --quick limits the run to small inputs.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from itertools import product
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRANSFORMS = {
+    "log": ("ParametrizedLogTransform", {"t": 262144, "m": 4.5}),
+    "asinh": ("AsinhTransform", {"t": 262144, "m": 4.5, "a": 0.0}),
+    "logicle": ("LogicleTransform", {"t": 262144, "w": 0.5, "m": 4.5, "a": 0.0}),
+    "hyperlog": ("HyperlogTransform", {"t": 262144, "w": 1.0, "m": 4.5, "a": 0.0}),
+}
+EXECUTORS = {
+    "serial": ("serial", 1),
+    "threads": ("threads", -1),
+    "processes": ("processes", -1),
+}
+DIRECTIONS = ["forward", "inverse"]
+INPUTS = ["array", "dataframe"]
+EVENTS = [10**3, 10**5, 10**6, 10**7, 10**8]
+CHANNELS = [1, 8, 64]
+QUICK_EVENTS = [10**3, 10**5, 10**6]
+QUICK_CHANNELS = [1, 8]
+
+
+def _events(n: int, channels: int, positive: bool, rng: np.random.Generator):
+    """
+    Cytometry-like intensities: a compensated negative population spread around zero and a
+    log-normal positive population reaching the top of the 18-bit range.
+    """
+    x = np.where(
+        rng.random((n, channels)) < 0.5,
+        rng.normal(0, 100, (n, channels)),
+        rng.lognormal(7, 2, (n, channels)).clip(max=262144),
+    )
+    return np.abs(x) + 1 if positive else x
+
+
+def _peak_rss_mb() -> tuple[float, float]:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 2**20
+    return own, children
+
+
+def run_case(case: dict) -> dict:
+    """
+    Time one benchmark case in this process, returning case with the timings and peak RSS added.
+    """
+    import pandas as pd
+
+    import cytotransform
+
+    class_name, params = TRANSFORMS[case["transform"]]
+    executor, n_jobs = EXECUTORS[case["executor"]]
+    rng = np.random.default_rng(42)
+    data = _events(case["events"], case["channels"], case["transform"] == "log", rng)
+    transformer = getattr(cytotransform, class_name)(
+        **params, n_jobs=n_jobs, executor=executor
+    )
+    if case["direction"] == "inverse":
+        data = transformer.transform(data)
+        func = transformer.inverse_transform
+    else:
+        func = transformer.transform
+    if case["input"] == "dataframe":
+        data = pd.DataFrame(data, columns=[f"ch{i}" for i in range(data.shape[1])])
+    # the first call starts pools and builds lookup tables
+    func(data)
+    times = []
+    for _ in range(case["repeat"]):
+        start = time.perf_counter()
+        func(data)
+        times.append(time.perf_counter() - start)
+    transformer.close()
+    best = min(times)
+    peak_rss, peak_rss_children = _peak_rss_mb()
+    return {
+        **case,
+        "seconds": best,
+        "median_seconds": float(np.median(times)),
+        "events_per_sec": case["events"] / best,
+        "values_per_sec": case["events"] * case["channels"] / best,
+        "peak_rss_mb": peak_rss,
+        "peak_rss_children_mb": peak_rss_children,
+    }
+
+
+def _repeats(events: int, channels: int) -> int:
+    size = events * channels
+    return 20 if size <= 10**5 else 5 if size <= 10**7 else 2
+
+
+def _memory_limit() -> int:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 4
+    except (ValueError, OSError, AttributeError):  # pragma: no cover
+        return 8 * 2**30
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=ROOT,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _machine() -> dict:
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def _key(result: dict) -> tuple:
+    return tuple(
+        result[k]
+        for k in ("transform", "direction", "input", "events", "channels", "executor")
+    )
+
+
+def compare(results: list[dict], baseline: list[dict]):
+    """
+    Print the throughput of results relative to a baseline run (> 1 is faster).
+    """
+    previous = {_key(r): r for r in baseline}
+    print(f"\n{'case':<60} {'events/s':>12} {'baseline':>12} {'ratio':>7}")
+    for result in results:
+        before = previous.get(_key(result))
+        if before is None:
+            continue
+        ratio = result["events_per_sec"] / before["events_per_sec"]
+        name = "/".join(str(k) for k in _key(result))
+        print(
+            f"{name:<60} {result['events_per_sec']:>12.3g} "
+            f"{before['events_per_sec']:>12.3g} {ratio:>7.2f}"
+        )
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--transforms", nargs="+", choices=TRANSFORMS, default=list(TRANSFORMS)
+    )
+    parser.add_argument(
+        "--directions", nargs="+", choices=DIRECTIONS, default=DIRECTIONS
+    )
+    parser.add_argument("--inputs", nargs="+", choices=INPUTS, default=INPUTS)
+    parser.add_argument("--events", nargs="+", type=float, default=None)
+    parser.add_argument("--channels", nargs="+", type=int, default=None)
+    parser.add_argument(
+        "--executors", nargs="+", choices=EXECUTORS, default=list(EXECUTORS)
+    )
+    parser.add_argument("--quick", action="store_true", help="small sizes only")
+    parser.add_argument(
+        "--max-bytes",
+        type=float,
+        default=_memory_limit(),
+        help="skip cases whose input is larger than this (default: a quarter of RAM)",
+    )
+    parser.add_argument("--output", default="benchmark.json", help="JSON results file")
+    parser.add_argument(
+        "--compare", help="JSON results of a previous run to compare with"
+    )
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        # child process: run a single case and report it on stdout
+        print(json.dumps(run_case(json.loads(args.case))))
+        return
+
+    events = [int(n) for n in args.events or (QUICK_EVENTS if args.quick else EVENTS)]
+    channels = args.channels or (QUICK_CHANNELS if args.quick else CHANNELS)
+    results = []
+    for transform, direction, input_, n, c, executor in product(
+        args.transforms, args.directions, args.inputs, events, channels, args.executors
+    ):
+        case = {
+            "transform": transform,
+            "direction": direction,
+            "input": input_,
+            "events": n,
+            "channels": c,
+            "executor": executor,
+            "repeat": _repeats(n, c),
+        }
+        if n * c * 8 > args.max_bytes:
+            print(f"skipping {'/'.join(str(v) for v in case.values())}: too large")
+            continue
+        completed = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.run_benchmarks",
+                "--case",
+                json.dumps(case),
+            ],
+            capture_output=True,
+            text=True,
+            cwd=ROOT,
+        )
+        if completed.returncode != 0:
+            print(completed.stderr, file=sys.stderr)
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(
+            f"{transform:>8} {direction:>7} {input_:>9} {n:>10} x {c:<3} {executor:>9}: "
+            f"{result['events_per_sec']:10.3g} events/s, "
+            f"peak RSS {result['peak_rss_mb']:.0f} MB"
+        )
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "commit": _commit(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "machine": _machine(),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)["results"])
+
+
+if __name__ == "__main__":
+    main()
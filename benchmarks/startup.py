@@ -0,0 +1,74 @@
+"""
+Startup benchmark: the time a fresh interpreter takes to import cytotransform and construct a
+transformer, as paid by every short-lived worker or batch job.
+
+Each repeat runs in a new subprocess, and the median is checked against a budget (exit status 1 when
+it is exceeded). The time to import numpy alone is reported alongside, as the floor:
+
+    python -m benchmarks.startup --budget 0.25
+
+Run from the repository root to benchmark the working tree.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+DEFAULT_BUDGET = 0.25
+DEFAULT_STATEMENT = "import cytotransform; cytotransform.AsinhTransform()"
+# dependencies that must not be imported by the statement
+HEAVY_MODULES = ("pandas", "joblib", "scipy", "numba", "pyarrow", "matplotlib")
+
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+exec({statement!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure(statement: str) -> dict:
+    """
+    Run statement in a fresh interpreter, returning its wall time and the modules it left imported.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-c", _CHILD.format(statement=statement)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--statement", default=DEFAULT_STATEMENT)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=DEFAULT_BUDGET,
+        help=f"maximum median seconds (default: {DEFAULT_BUDGET})",
+    )
+    args = parser.parse_args(argv)
+
+    runs = [measure(args.statement) for _ in range(args.repeat)]
+    median = statistics.median(run["seconds"] for run in runs)
+    numpy = statistics.median(
+        measure("import numpy")["seconds"] for _ in range(args.repeat)
+    )
+    heavy = [m for m in HEAVY_MODULES if m in runs[0]["modules"]]
+    print(
+        f"{args.statement}: {median * 1e3:.1f} ms (numpy alone: {numpy * 1e3:.1f} ms)"
+    )
+    if heavy:
+        print(f"imported: {', '.join(heavy)}")
+    if median > args.budget:
+        print(f"over budget of {args.budget * 1e3:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
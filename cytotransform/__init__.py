@@ -1,4 +1,44 @@
-from .log import ParametrizedLogTransform
-from .asinh import AsinhTransform
-from .hyperlog import HyperlogTransform
-from .logicle import LogicleTransform
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+# public names and the modules that define them. They are imported on first access, so importing
+# the package (or using only one transform) does not import every transform and their dependencies
+_EXPORTS = {
+    "ParametrizedLogTransform": ".log",
+    "AsinhTransform": ".asinh",
+    "HyperlogTransform": ".hyperlog",
+    "LogicleTransform": ".logicle",
+    "MultiChannelTransform": ".multichannel",
+    "TabulatedTransform": ".base",
+    "histogram2d": ".histogram",
+    "TransformPipeline": ".pipeline",
+    "CallStats": ".profiling",
+    "Profiler": ".profiling",
+    "FCSFile": ".io",
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .asinh import AsinhTransform
+    from .base import TabulatedTransform
+    from .histogram import histogram2d
+    from .hyperlog import HyperlogTransform
+    from .io import FCSFile
+    from .log import ParametrizedLogTransform
+    from .logicle import LogicleTransform
+    from .multichannel import MultiChannelTransform
+    from .pipeline import TransformPipeline
+    from .profiling import CallStats, Profiler
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *_EXPORTS})
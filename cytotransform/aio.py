@@ -0,0 +1,204 @@
+"""
+Transforms for asyncio code (see Transform.transform_async). Work runs in one shared, bounded thread
+pool rather than on the event loop, and small requests for the same compiled transform are coalesced:
+those made while the loop runs one iteration, or while earlier batches of the same transform occupy
+every worker, are concatenated into a single vectorized call whose result is split back out. Under
+many concurrent requests this keeps the number of calls, and so the per-call overhead and the queue,
+small. A bounded number of requests are in flight per event loop; further requests wait for a slot.
+"""
+import asyncio
+import threading
+import weakref
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable
+
+import numpy as np
+
+from .base import BinnedTransform, bin_dtype, float_dtype
+from .executor import cpu_count
+
+# requests of up to this many values are coalesced with others for the same transform
+MAX_COALESCED_VALUES = 1 << 16
+# a batch is started without waiting for the loop iteration to end once it holds this many values
+MAX_BATCH_VALUES = 1 << 20
+# requests queued or running per event loop, beyond which requests wait for a slot
+MAX_PENDING = 1024
+
+_pool: ThreadPoolExecutor | None = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+_queues: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def shared_pool() -> ThreadPoolExecutor:
+    """
+    The thread pool running the work of all async transform calls, one worker per CPU.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None:
+            _pool_workers = cpu_count()
+            _pool = ThreadPoolExecutor(
+                max_workers=_pool_workers, thread_name_prefix="cytotransform"
+            )
+    return _pool
+
+
+def pool_workers() -> int:
+    """
+    The number of workers of the shared pool.
+    """
+    shared_pool()
+    return _pool_workers
+
+
+def _run_batch(
+    func: Callable, dtype: np.dtype, out_dtype: np.dtype, arrays: list[np.ndarray]
+) -> list[np.ndarray]:
+    values = np.concatenate([np.ravel(array) for array in arrays]).astype(
+        dtype, copy=False
+    )
+    out = np.empty(values.size, dtype=out_dtype)
+    func(values, out=out)
+    bounds = np.cumsum([array.size for array in arrays])[:-1]
+    return [
+        part.reshape(array.shape) for part, array in zip(np.split(out, bounds), arrays)
+    ]
+
+
+def _run_requests(
+    func: Callable,
+    inverse: bool,
+    dtype: np.dtype,
+    out_dtype: np.dtype,
+    arrays: list[np.ndarray],
+) -> list[np.ndarray | Exception]:
+    """
+    Run a coalesced batch of requests, returning the result of each. If the batch fails, each request
+    is run on its own so that only those at fault get their error, in place of a result.
+    """
+    if inverse:
+        func = func.inverse
+    try:
+        return _run_batch(func, dtype, out_dtype, arrays)
+    except Exception:
+        if len(arrays) == 1:
+            raise
+    results = []
+    for array in arrays:
+        try:
+            results.extend(_run_batch(func, dtype, out_dtype, [array]))
+        except Exception as error:
+            results.append(error)
+    return results
+
+
+class _Pending:
+    def __init__(self):
+        self.arrays: list[np.ndarray] = []
+        self.futures: list[asyncio.Future] = []
+        self.n_values = 0
+
+
+class RequestQueue:
+    """
+    Requests of one event loop: coalesced batches per (func, inverse, dtype, out_dtype) key, and the
+    slots bounding the number of requests in flight (by default MAX_PENDING).
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_pending: int | None = None):
+        self.loop = loop
+        self.slots = asyncio.Semaphore(max_pending or MAX_PENDING)
+        self.pending: dict[tuple, _Pending] = {}
+        self.running: defaultdict[tuple, int] = defaultdict(int)
+
+    async def coalesce(self, key: tuple, values: np.ndarray) -> np.ndarray:
+        """
+        Transform values as part of a batch of the requests for the same key.
+        """
+        async with self.slots:
+            future = self.loop.create_future()
+            pending = self.pending.setdefault(key, _Pending())
+            pending.arrays.append(values)
+            pending.futures.append(future)
+            pending.n_values += values.size
+            if pending.n_values >= MAX_BATCH_VALUES:
+                self._flush(key)
+            elif len(pending.futures) == 1:
+                # flushed once the requests made in this iteration of the loop have joined
+                self.loop.call_soon(self._flush, key)
+            return await future
+
+    async def run(self, call: Callable):
+        """
+        Run call in the shared pool.
+        """
+        async with self.slots:
+            return await self.loop.run_in_executor(shared_pool(), call)
+
+    def _flush(self, key: tuple):
+        if self.running[key] >= pool_workers():
+            # every worker is busy with this transform: the batch grows until one is done
+            return
+        pending = self.pending.pop(key, None)
+        if pending is None:
+            return
+        self.running[key] += 1
+        task = self.loop.run_in_executor(
+            shared_pool(), _run_requests, *key, pending.arrays
+        )
+        task.add_done_callback(partial(self._done, key, pending.futures))
+
+    def _done(self, key: tuple, futures: list[asyncio.Future], task: asyncio.Future):
+        self.running[key] -= 1
+        if key in self.pending:
+            self._flush(key)
+        error = task.exception()
+        results = [error] * len(futures) if error is not None else task.result()
+        for future, result in zip(futures, results):
+            # requests may have been cancelled while waiting
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def _queue() -> RequestQueue:
+    loop = asyncio.get_running_loop()
+    if loop not in _queues:
+        _queues[loop] = RequestQueue(loop)
+    return _queues[loop]
+
+
+async def call(
+    transformer,
+    data,
+    func: Callable,
+    columns: list | None = None,
+    inverse: bool = False,
+):
+    """
+    Run func (the compiled transform of transformer or a BinnedTransform of it), or its inverse if
+    inverse, over data from a coroutine, coalescing small elementwise requests.
+    """
+    queue = _queue()
+    if (
+        transformer.elementwise
+        and columns is None
+        and isinstance(data, np.ndarray)
+        and data.size <= MAX_COALESCED_VALUES
+    ):
+        dtype = transformer.dtype or float_dtype(data)
+        binned = isinstance(func, BinnedTransform)
+        out_dtype = bin_dtype(func.n_bins) if binned else dtype
+        # requests are keyed on the plan and direction rather than on the function run, as compiled
+        # plans compare equal when their parameters are (and their bound inverses do not), so
+        # requests to different transformers with the same parameters share batches
+        return await queue.coalesce((func, inverse, dtype, out_dtype), data)
+    if inverse:
+        func = func.inverse
+    return await queue.run(partial(transformer._call, data, func, columns=columns))
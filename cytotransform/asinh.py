@@ -1,9 +1,45 @@
+from dataclasses import dataclass, field
+from functools import partial
+
 import numpy as np
 
-from .base import Transform
+from . import jit
+from .base import FLOAT_DTYPES, CompiledTransform, Transform, float_dtype
+from .executor import Executor
+
+
+def asinh_constants(t, m, a) -> tuple:
+    """
+    The pre-scale, transpose and divisor of the asinh transform (arrays for per-channel parameters).
+    """
+    log10 = np.log(10)
+    m, a = np.asarray(m), np.asarray(a)
+    return np.sinh(m * log10) / np.asarray(t), a * log10, (m + a) * log10
+
+
+def _asinh(x, out, dtype, pre_scale, transpose, divisor) -> np.ndarray:
+    out = np.multiply(x, pre_scale, out=out, dtype=dtype)
+    np.arcsinh(out, out=out)
+    out += transpose
+    out /= divisor
+    return out
 
 
-def arcsinh_transform(x: np.ndarray, t: float, m: float, a: float) -> np.ndarray:
+def _inverse_asinh(x, out, dtype, pre_scale, transpose, divisor) -> np.ndarray:
+    out = np.multiply(x, divisor, out=out, dtype=dtype)
+    out -= transpose
+    np.sinh(out, out=out)
+    out /= pre_scale
+    return out
+
+
+def _cast(constants: tuple, dtype: np.dtype) -> tuple:
+    return tuple(np.asarray(c, dtype=dtype)[()] for c in constants)
+
+
+def arcsinh_transform(
+    x: np.ndarray, t: float, m: float, a: float, out: np.ndarray | None = None
+) -> np.ndarray:
     """
     Perform an Arcsinh transformation on the given data.
 
@@ -17,6 +53,10 @@ def arcsinh_transform(x: np.ndarray, t: float, m: float, a: float) -> np.ndarray
         Parameter for the number of decades
     a: float
         Parameter for the number of additional negative decades
+    out: Numpy.Array, optional
+        Array to write the result into, which may be x itself to transform in place. The
+        transform computes in the dtype of out, or of x if out is not given (float32 input
+        stays float32, anything else is computed in float64).
 
     Returns
     -------
@@ -24,14 +64,12 @@ def arcsinh_transform(x: np.ndarray, t: float, m: float, a: float) -> np.ndarray
         The Arcsinh-transformed data.
     """
     x = np.asarray(x)
-    pre_scale = np.sinh(m * np.log(10)) / t
-    transpose = a * np.log(10)
-    divisor = (m + a) * np.log(10)
-    return (np.arcsinh(x * pre_scale) + transpose) / divisor
+    dtype = float_dtype(x, out)
+    return _asinh(x, out, dtype, *_cast(asinh_constants(t, m, a), dtype))
 
 
 def inverse_arcsinh_transform(
-    x: np.ndarray, t: float, m: float, a: float
+    x: np.ndarray, t: float, m: float, a: float, out: np.ndarray | None = None
 ) -> np.ndarray:
     """
     Perform the inverse Arcsinh transformation on the given transformed data.
@@ -46,6 +84,10 @@ def inverse_arcsinh_transform(
         Parameter for the number of decades
     a: float
         Parameter for the number of additional negative decades
+    out: Numpy.Array, optional
+        Array to write the result into, which may be x itself to transform in place. The
+        transform computes in the dtype of out, or of x if out is not given (float32 input
+        stays float32, anything else is computed in float64).
 
     Returns
     -------
@@ -53,24 +95,143 @@ def inverse_arcsinh_transform(
         The original (untransformed) data.
     """
     x = np.asarray(x)
-    pre_scale = np.sinh(m * np.log(10)) / t
-    transpose = a * np.log(10)
-    divisor = (m + a) * np.log(10)
+    dtype = float_dtype(x, out)
+    return _inverse_asinh(x, out, dtype, *_cast(asinh_constants(t, m, a), dtype))
 
-    return (np.sinh((x * divisor) - transpose)) / pre_scale
+
+@dataclass(frozen=True)
+class AsinhPlan(CompiledTransform):
+    """
+    Compiled asinh transform, with its constants precomputed in float32 and float64. With the numba
+    backend (and scalar parameters) it runs as a single parallel loop.
+    """
+
+    t: float | tuple
+    m: float | tuple
+    a: float | tuple
+    backend: str = "numpy"
+    constants: dict = field(init=False, repr=False, compare=False)
+    parallel: bool = field(default=False, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        constants = asinh_constants(self.t, self.m, self.a)
+        self._set(
+            constants={dtype: _cast(constants, dtype) for dtype in FLOAT_DTYPES},
+            parallel=self.backend == "numba" and np.ndim(constants[0]) == 0,
+        )
+
+    def __call__(self, x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        if self.parallel:
+            return jit.apply("asinh", x, out, *self.constants[FLOAT_DTYPES[1]])
+        x = np.asarray(x)
+        dtype = float_dtype(x, out)
+        return _asinh(x, out, dtype, *self.constants[dtype])
+
+    def inverse(self, x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        if self.parallel:
+            return jit.apply("inverse_asinh", x, out, *self.constants[FLOAT_DTYPES[1]])
+        x = np.asarray(x)
+        dtype = float_dtype(x, out)
+        return _inverse_asinh(x, out, dtype, *self.constants[dtype])
 
 
 class AsinhTransform(Transform):
+    broadcast_parameters = True
+
     def __init__(
-        self, m: float = 4.5, t: int = 262144, a: float = 0.0, n_jobs: int = -1
+        self,
+        m: float = 4.5,
+        t: int = 262144,
+        a: float = 0.0,
+        n_jobs: int = -1,
+        executor: str | Executor = "auto",
+        dtype: str | np.dtype | None = None,
+        backend: str = "numpy",
     ):
+        """
+        Parameters
+        ----------
+        m: float
+            The "magnitude" is the number of decades that the transformation spans in
+            logarithmic space. It determines the dynamic range of the transformed data.
+        t: int
+            The maximum value of the input data that the transformation should handle, which
+            maps to the top of the scale.
+        a: float
+            The number of additional decades of negative data values to be included.
+        n_jobs: int
+            Number of parallel workers, -1 uses all available cores and 0 or 1 runs serially.
+        executor: str | Executor
+            How batches are run in parallel: "threads", "processes" or "serial", or an Executor
+            instance to share one worker pool between transformers. The default, "auto", picks
+            for each call whichever of these a calibrated cost model predicts to be fastest.
+        dtype: str | np.dtype, optional
+            Compute (and return) float32 or float64. By default float32 input stays float32 and
+            anything else is computed in float64.
+        backend: str
+            "numpy", or "numba" to run each transform as a single compiled parallel loop (which
+            falls back to "numpy" if numba is not installed).
+        """
+        self.backend = jit.resolve_backend(backend)
         super().__init__(
             transform_function=arcsinh_transform,
             inverse_transform_function=inverse_arcsinh_transform,
             parameters={"t": t, "m": m, "a": a},
             n_jobs=n_jobs,
+            executor=executor,
+            dtype=dtype,
         )
 
+    @classmethod
+    def from_data(
+        cls,
+        data,
+        columns: list | None = None,
+        m: float = 4.5,
+        t: float | None = None,
+        q: float = 0.05,
+        chunk_rows: int = 1 << 18,
+        **kwargs,
+    ):
+        """
+        An asinh transform with parameters estimated from data: T is the largest value and A the
+        number of additional negative decades that bring r, the q quantile of the negative values,
+        to the bottom of the scale, as in the rule of Parks, Roederer and Moore for logicle (see
+        cytotransform.estimate). The data is read once, chunk by chunk, into a quantile sketch
+        rather than sorted, so it does not need to fit in memory.
+
+        Parameters
+        ----------
+        data: np.ndarray | pd.DataFrame | FCSFile | str | os.PathLike | Iterable
+            One channel (1-D array) or several (2-D array, DataFrame, FCS file), a path to a .npy,
+            FCS or Parquet file, or an iterable of chunks (arrays or DataFrames) of the data.
+        columns: list, optional
+            Channels to estimate parameters for, by name or position, by default all of them.
+        m: float
+            Number of decades of the scale.
+        t: float, optional
+            Top of the scale, by default the largest value of each channel.
+        q: float
+            Quantile of the negative values that the scale reaches down to.
+        chunk_rows: int
+            Number of rows read at a time.
+        kwargs:
+            Other arguments of the transformer (n_jobs, executor, dtype, backend).
+
+        Returns
+        -------
+        AsinhTransform | MultiChannelTransform
+            A transformer for 1-D data, otherwise a MultiChannelTransform with parameters per
+            channel.
+        """
+        from . import estimate
+
+        rule = partial(estimate.asinh_parameters, m=m, t=t, q=q)
+        return estimate.from_data(cls, data, rule, columns, chunk_rows, **kwargs)
+
+    def compile(self) -> AsinhPlan:
+        return AsinhPlan(**self.parameters, backend=self.backend)
+
     def validation(self):
         if not self.parameters["t"] > 0:
             raise ValueError("t must be strictly positive")
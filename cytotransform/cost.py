@@ -0,0 +1,282 @@
+import json
+import math
+import os
+import platform
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from .executor import Executor
+
+CACHE_VERSION = 2
+# number of elements timed when measuring the cost of a transform function
+CALIBRATION_SIZE = 1 << 16
+# below this many elements work always runs serially, without calibrating anything
+MIN_PARALLEL_ELEMENTS = 1 << 14
+# largest batch sent to a process worker, bounding the memory used to pickle batches
+MAX_PROCESS_BATCH_BYTES = 1 << 26
+
+
+def cache_dir() -> Path:
+    """
+    Directory holding the calibration cache: $CYTOTRANSFORM_CACHE_DIR if set, otherwise
+    cytotransform in the user cache directory.
+    """
+    path = os.environ.get("CYTOTRANSFORM_CACHE_DIR")
+    if path:
+        return Path(path)
+    return (
+        Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "cytotransform"
+    )
+
+
+def _machine() -> str:
+    return f"{platform.node()}|{platform.machine()}|{os.cpu_count()}"
+
+
+def function_key(func: Callable, dtype: np.dtype) -> str:
+    """
+    Key under which the measured cost of a transform function is stored: the qualified name of the
+    function (of the wrapped function for partials, of the class for callable objects), with the
+    backend of plans that have several, as each backend has its own costs.
+    """
+    func = getattr(func, "func", func)
+    name = getattr(func, "__qualname__", None) or type(func).__qualname__
+    module = getattr(func, "__module__", None) or type(func).__module__
+    key = f"{module}.{name}|{np.dtype(dtype).name}"
+    backend = getattr(getattr(func, "__self__", func), "backend", None)
+    return key if backend is None else f"{key}|{backend}"
+
+
+def _noop(x):
+    return x
+
+
+def _best_time(call: Callable, repeat: int = 3) -> float:
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class Plan(NamedTuple):
+    """
+    How to run a transform: the kind of executor ("serial", "threads" or "processes") and the
+    number of batches to split the data into.
+    """
+
+    kind: str
+    n_batches: int
+
+
+class CostModel:
+    """
+    Predicts the run time of a transform call under each way of running it, from costs measured on
+    this machine: the time per element of each transform function, the parallel efficiency of
+    running it in threads, and the per-task and per-byte overheads of thread and process pools.
+
+    Each cost is measured the first time it is needed and saved to a JSON file in cache_dir(), so
+    calibration happens once per machine rather than once per session.
+    """
+
+    def __init__(self, path: str | os.PathLike | None = None):
+        self.path = Path(path) if path is not None else cache_dir() / "cost_model.json"
+        self._lock = threading.RLock()
+        self._costs: dict | None = None
+
+    @property
+    def costs(self) -> dict:
+        if self._costs is None:
+            self._costs = self._load()
+        return self._costs
+
+    def _load(self) -> dict:
+        empty = {"version": CACHE_VERSION, "machine": _machine(), "functions": {}}
+        try:
+            with open(self.path) as f:
+                costs = json.load(f)
+        except (OSError, ValueError):
+            return empty
+        if costs.get("version") != CACHE_VERSION or costs.get("machine") != _machine():
+            return empty
+        return costs
+
+    def _save(self):
+        # write atomically, and carry on uncached if the cache directory is not writable
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.costs, f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def _measure(self, section: dict, name: str, measure: Callable[[], float]) -> float:
+        with self._lock:
+            if name not in section:
+                section[name] = measure()
+                self._save()
+            return section[name]
+
+    def element_cost(
+        self, func: Callable, dtype: np.dtype, sample: np.ndarray
+    ) -> float:
+        """
+        Seconds per element of func run serially, measured on CALIBRATION_SIZE elements.
+        """
+        section = self.costs["functions"].setdefault(function_key(func, dtype), {})
+
+        def measure() -> float:
+            x = _sample(sample, CALIBRATION_SIZE, dtype)
+            out = np.empty_like(x)
+            with np.errstate(all="ignore"):
+                func(x, out=out)
+                return _best_time(lambda: func(x, out=out)) / x.size
+
+        return self._measure(section, "element", measure)
+
+    def thread_efficiency(
+        self,
+        func: Callable,
+        dtype: np.dtype,
+        sample: np.ndarray,
+        executor: Executor,
+    ) -> float:
+        """
+        Speed-up of func run on executor.n_jobs threads, as a fraction of executor.n_jobs. Low for
+        functions that hold the GIL.
+        """
+        section = self.costs["functions"].setdefault(function_key(func, dtype), {})
+        element = self.element_cost(func, dtype, sample)
+        n_jobs = executor.n_jobs
+
+        def measure() -> float:
+            x = _sample(sample, CALIBRATION_SIZE * n_jobs, dtype)
+            out = np.empty_like(x)
+            blocks = np.array_split(np.arange(x.size), n_jobs)
+            slices = [slice(b[0], b[-1] + 1) for b in blocks]
+
+            def work(s: slice):
+                # error states are per thread
+                with np.errstate(all="ignore"):
+                    func(x[s], out=out[s])
+
+            with np.errstate(all="ignore"):
+                executor.map(work, slices)
+                elapsed = _best_time(lambda: executor.map(work, slices))
+            return min(1.0, element * x.size / (elapsed * n_jobs))
+
+        return self._measure(section, f"threads_{n_jobs}", measure)
+
+    def task_overhead(self, kind: str, executor: Executor) -> float:
+        """
+        Seconds of overhead per task submitted to the pool of executor, of the given kind.
+        """
+        section = self.costs.setdefault("overheads", {})
+
+        def measure() -> float:
+            items = list(range(4 * executor.n_jobs))
+            executor.map(_noop, items)
+            return _best_time(lambda: executor.map(_noop, items)) / len(items)
+
+        return self._measure(section, f"{kind}_task", measure)
+
+    def process_byte_cost(self, executor: Executor) -> float:
+        """
+        Seconds per byte to send an array to a process worker and receive a result of the same size.
+        """
+        section = self.costs.setdefault("overheads", {})
+        task = self.task_overhead("processes", executor)
+
+        def measure() -> float:
+            x = np.zeros((2, 1 << 20))
+            executor.map(_noop, list(x))
+            elapsed = _best_time(lambda: executor.map(_noop, list(x))) / len(x)
+            return max(elapsed - task, 0.0) / (2 * x[0].nbytes)
+
+        return self._measure(section, "process_byte", measure)
+
+    def plan(
+        self,
+        n_elements: int,
+        itemsize: int,
+        n_jobs: int,
+        element: float,
+        threads: tuple[float, float] | None = None,
+        processes: tuple[float, float] | None = None,
+    ) -> Plan:
+        """
+        Choose the fastest way to run a transform over n_elements elements.
+
+        Parameters
+        ----------
+        n_elements: int
+            Number of values to transform.
+        itemsize: int
+            Bytes per value.
+        n_jobs: int
+            Maximum number of parallel workers.
+        element: float
+            Seconds per element run serially.
+        threads: tuple[float, float], optional
+            Parallel efficiency and per-task overhead of threads, if threads may be used.
+        processes: tuple[float, float], optional
+            Per-task and per-byte overheads of processes, if processes may be used.
+
+        Returns
+        -------
+        Plan
+            The kind of executor and number of batches with the lowest predicted time.
+        """
+        work = n_elements * element
+        options = [(work, Plan("serial", 1))]
+        if threads is not None:
+            efficiency, overhead = threads
+            n = _n_batches(work / efficiency, overhead, n_jobs)
+            options.append((work / (n * efficiency) + n * overhead, Plan("threads", n)))
+        if processes is not None:
+            overhead, per_byte = processes
+            n = _n_batches(work, overhead, n_jobs)
+            transfer = 2 * n_elements * itemsize * per_byte
+            # more batches than workers if needed to bound the size of each pickled batch
+            n_batches = max(
+                n, math.ceil(n_elements * itemsize / MAX_PROCESS_BATCH_BYTES)
+            )
+            options.append(
+                (
+                    work / n + n_batches * overhead + transfer,
+                    Plan("processes", n_batches),
+                )
+            )
+        return min(options, key=lambda option: option[0])[1]
+
+
+def _n_batches(work: float, overhead: float, n_jobs: int) -> int:
+    # minimises work / n + n * overhead
+    if overhead <= 0:
+        return n_jobs
+    return int(min(max(round(math.sqrt(work / overhead)), 2), n_jobs))
+
+
+def _sample(sample: np.ndarray, size: int, dtype: np.dtype) -> np.ndarray:
+    return np.resize(np.asarray(sample, dtype=dtype), size)
+
+
+_default_model: CostModel | None = None
+
+
+def get_cost_model() -> CostModel:
+    """
+    The cost model shared by all transformers in this process.
+    """
+    global _default_model
+    if _default_model is None:
+        _default_model = CostModel()
+    return _default_model
@@ -0,0 +1,360 @@
+"""
+Data-driven parameters for the logicle, hyperlog and asinh transforms (see their from_data
+constructors), following the rule of Parks, Roederer and Moore: the top of the scale T is the largest
+value of the data, and the linear width W is set so that the scale reaches down to r, a low
+percentile (5% by default) of the negative values:
+
+    W = (M - log10(T / |r|)) / 2
+
+Both are estimated in a single streaming pass from a mergeable quantile sketch, so no data is
+sorted or held in memory: data can be read chunk by chunk from disk, and sketches of different
+chunks (or files) can be built separately and merged.
+
+Parks DR, Roederer M, Moore WA. A new "Logicle" display method avoids deceptive effects of
+logarithmic scaling for low signals and compensated data. Cytometry A. 2006 Jun;69(6):541-51.
+"""
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING, Callable, Iterator
+
+import numpy as np
+
+from . import stream
+from .base import is_dataframe
+from .executor import Executor, get_executor
+from .io import FCSFile
+
+if TYPE_CHECKING:  # pragma: no cover
+    import pandas as pd
+
+    from .base import Transform
+
+# percentile of the negative values that the scale reaches down to
+NEGATIVE_QUANTILE = 0.05
+DEFAULT_CHUNK_ROWS = 1 << 18
+# options passed to a MultiChannelTransform itself rather than to its per-channel transformers
+_MULTICHANNEL_OPTIONS = ("n_jobs", "executor", "dtype")
+
+
+class QuantileSketch:
+    """
+    Streaming, mergeable quantile sketch of the values of one or more channels, after DDSketch:
+    values are counted in logarithmically spaced buckets (one set for positive values and one for
+    negative values), so that every quantile is estimated to within relative_accuracy of its true
+    value in a fixed amount of memory, without storing or sorting the data. Sketches merge by adding
+    their counts. The exact minimum and maximum of each channel are kept alongside.
+
+    Magnitudes below min_value count as zero and those above max_value as max_value. NaN is
+    ignored.
+    """
+
+    def __init__(
+        self,
+        n_channels: int = 1,
+        relative_accuracy: float = 0.01,
+        min_value: float = 1e-3,
+        max_value: float = 1e12,
+    ):
+        """
+        Parameters
+        ----------
+        n_channels: int
+            Number of channels, each sketched separately.
+        relative_accuracy: float
+            Maximum relative error of the estimated quantiles, between 0 and 1.
+        min_value: float
+            Smallest magnitude told apart from zero.
+        max_value: float
+            Largest magnitude told apart from each other.
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        if not 0 < min_value < max_value:
+            raise ValueError("min_value must be positive and less than max_value")
+        self.n_channels = n_channels
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(gamma)
+        # bucket k > 0 holds magnitudes in (min_value * gamma**(k - 1), min_value * gamma**k]
+        self.n_buckets = int(np.ceil(np.log(max_value / min_value) / self._log_gamma))
+        # negative buckets (most negative first), the zero bucket, then positive buckets, so that
+        # buckets are in the order of their values
+        self.counts = np.zeros((n_channels, 2 * self.n_buckets + 1), dtype=np.int64)
+        self.min = np.full(n_channels, np.inf)
+        self.max = np.full(n_channels, -np.inf)
+        k = np.arange(1, self.n_buckets + 1)
+        magnitudes = min_value * gamma**k * 2 / (1 + gamma)
+        self._values = np.concatenate([-magnitudes[::-1], [0.0], magnitudes])
+
+    @property
+    def count(self) -> np.ndarray:
+        """
+        Number of (non-NaN) values sketched per channel.
+        """
+        return self.counts.sum(axis=1)
+
+    def update(self, values: np.ndarray, executor: Executor | None = None):
+        """
+        Add a chunk of values: an array of shape (rows, n_channels), or (rows,) for a single channel.
+        Channels are sketched in parallel with the executor, if one is given.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[:, None]
+        if values.ndim != 2 or values.shape[1] != self.n_channels:
+            raise ValueError(
+                f"expected values of shape (rows, {self.n_channels}), got {values.shape}"
+            )
+        # each channel only writes its own row of counts, so channels can be sketched concurrently
+        work = lambda j: self._update_channel(j, values[:, j])  # noqa: E731
+        if executor is not None and self.n_channels > 1:
+            executor.map(work, range(self.n_channels))
+        else:
+            for j in range(self.n_channels):
+                work(j)
+
+    def _update_channel(self, j: int, values: np.ndarray):
+        values = values[~np.isnan(values)]
+        if not values.size:
+            return
+        self.min[j] = min(self.min[j], values.min())
+        self.max[j] = max(self.max[j], values.max())
+        with np.errstate(divide="ignore"):
+            k = np.ceil(np.log(np.abs(values) / self.min_value) / self._log_gamma)
+        np.clip(k, 0, self.n_buckets, out=k)
+        position = (self.n_buckets + np.sign(values) * k).astype(np.intp)
+        self.counts[j] += np.bincount(position, minlength=self.counts.shape[1])
+
+    def merge(self, other: QuantileSketch) -> QuantileSketch:
+        """
+        Add the counts of a sketch of other values of the same channels, made with the same settings.
+
+        Returns
+        -------
+        QuantileSketch
+            This sketch.
+        """
+        settings = ("n_channels", "relative_accuracy", "min_value", "max_value")
+        if any(getattr(self, name) != getattr(other, name) for name in settings):
+            raise ValueError("only sketches with the same settings can be merged")
+        self.counts += other.counts
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        return self
+
+    def quantile(self, q: float, negative: bool = False) -> np.ndarray:
+        """
+        Estimated q-quantile of each channel's values, or of its negative values only. NaN for
+        channels without any such values.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1")
+        counts = self.counts[:, : self.n_buckets] if negative else self.counts
+        cumulative = np.cumsum(counts, axis=1)
+        result = np.full(self.n_channels, np.nan)
+        for j, channel in enumerate(cumulative):
+            if channel[-1] == 0:
+                continue
+            rank = q * (channel[-1] - 1)
+            value = self._values[np.searchsorted(channel, rank, side="right")]
+            result[j] = np.clip(value, self.min[j], self.max[j])
+        return result
+
+
+def _channel_chunks(
+    data, columns: list | None, chunk_rows: int
+) -> tuple[list | None, Iterator[np.ndarray]]:
+    """
+    The channels of data (None for a single 1-D channel) and an iterator over chunks of their values
+    of shape (rows, channels).
+    """
+    if isinstance(data, (str, os.PathLike)):
+        data = stream.open_source(data)
+        if not isinstance(data, (np.ndarray, FCSFile)):
+            data = stream.parquet_chunks(data, chunk_rows)
+    if isinstance(data, FCSFile):
+        channels = data.channels if columns is None else list(columns)
+        chunks = data.chunks(chunk_rows, channels, dtype=np.float64)
+        return channels, (chunk for _, chunk in chunks)
+    if is_dataframe(data):
+        channels = (
+            list(data.columns) if columns is None else _frame_labels(data, columns)
+        )
+        return channels, (
+            data[channels].iloc[start : start + chunk_rows].to_numpy(np.float64)
+            for start in range(0, len(data), chunk_rows)
+        )
+    if isinstance(data, np.ndarray):
+        if data.ndim == 1:
+            if columns is not None:
+                raise TypeError("columns cannot be given for 1-D data")
+            return None, (
+                data[start : start + chunk_rows]
+                for start in range(0, len(data), chunk_rows)
+            )
+        if data.ndim != 2:
+            raise ValueError("data must be 1-D or 2-D")
+        channels = list(range(data.shape[1])) if columns is None else list(columns)
+        return channels, (
+            data[start : start + chunk_rows, channels]
+            for start in range(0, len(data), chunk_rows)
+        )
+    # any other iterable is taken to be chunks (arrays or DataFrames) of the data
+    chunks = iter(data)
+    first = next(chunks, None)
+    if first is None:
+        raise ValueError("no data to estimate parameters from")
+    channels, head = _channel_chunks(first, columns, max(1, len(first)))
+    return channels, _chain(head, chunks, channels)
+
+
+def _frame_labels(data: pd.DataFrame, columns: list) -> list:
+    # integers that are not labels of data are positions, as for FCS channels
+    return [
+        data.columns[column]
+        if isinstance(column, (int, np.integer)) and column not in data.columns
+        else column
+        for column in columns
+    ]
+
+
+def _chain(head: Iterator[np.ndarray], chunks: Iterator, channels: list | None):
+    # later chunks have the channels of the first, each read as a single chunk
+    yield from head
+    for chunk in chunks:
+        yield from _channel_chunks(chunk, channels, max(1, len(chunk)))[1]
+
+
+def sketch(
+    data,
+    columns: list | None = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    n_jobs: int = -1,
+    **options,
+) -> tuple[list | None, QuantileSketch]:
+    """
+    Sketch the values of each channel of data in one streaming pass, reading the next chunks in a
+    background thread while the current one is sketched, channels in parallel.
+
+    Parameters
+    ----------
+    data: np.ndarray | pd.DataFrame | FCSFile | str | os.PathLike | Iterable
+        Values of one channel (1-D array) or of several (2-D array, DataFrame, FCS file), a path to
+        a .npy, FCS or Parquet file, or an iterable of chunks (arrays or DataFrames) of the data.
+    columns: list, optional
+        Channels to sketch, by name or position, by default all of them.
+    chunk_rows: int
+        Number of rows read and sketched at a time.
+    n_jobs: int
+        Number of threads sketching the channels of a chunk in parallel, -1 for all cores.
+    options:
+        Settings of the QuantileSketch (relative_accuracy, min_value, max_value).
+
+    Returns
+    -------
+    tuple[list | None, QuantileSketch]
+        The channels (None for 1-D data) and their sketch.
+    """
+    if chunk_rows < 1:
+        raise ValueError("chunk_rows must be a positive integer")
+    channels, chunks = _channel_chunks(data, columns, chunk_rows)
+    result = QuantileSketch(1 if channels is None else len(channels), **options)
+    executor = get_executor("threads", n_jobs)
+    try:
+        for chunk in stream.read_ahead(chunks):
+            result.update(chunk, executor)
+    finally:
+        executor.shutdown()
+    return channels, result
+
+
+def negative_rule_parameters(
+    sketch: QuantileSketch,
+    m: float = 4.5,
+    t: float | None = None,
+    a: float = 0.0,
+    q: float = NEGATIVE_QUANTILE,
+    min_w: float = 0.0,
+) -> list[dict]:
+    """
+    Logicle (or hyperlog) parameters of each channel of a sketch, by the rule of Parks, Roederer and
+    Moore. T is the largest value (unless given) and W = (M - log10(T / |r|)) / 2, with r the q
+    quantile of the negative values, kept within [min_w, M / 2] and such that -W <= A <= M - 2W.
+    Channels without negative values get the smallest W.
+    """
+    tops = sketch.max if t is None else np.full(sketch.n_channels, float(t))
+    negatives = sketch.quantile(q, negative=True)
+    parameters = []
+    for top, r in zip(tops, negatives):
+        if not top > 0:
+            raise ValueError(
+                "t cannot be estimated from a channel without positive values"
+            )
+        low, high = max(min_w, -a), (m - a) / 2
+        w = (m - np.log10(top / -r)) / 2 if r < 0 else low
+        parameters.append(
+            {"w": float(np.clip(w, low, high)), "m": m, "t": float(top), "a": a}
+        )
+    return parameters
+
+
+def asinh_parameters(
+    sketch: QuantileSketch,
+    m: float = 4.5,
+    t: float | None = None,
+    q: float = NEGATIVE_QUANTILE,
+) -> list[dict]:
+    """
+    Asinh parameters of each channel of a sketch: T is the largest value (unless given) and A the
+    number of additional decades that bring r, the q quantile of the negative values, to the bottom
+    of the scale, kept within [0, M]. Channels without negative values get A = 0.
+    """
+    tops = sketch.max if t is None else np.full(sketch.n_channels, float(t))
+    negatives = sketch.quantile(q, negative=True)
+    parameters = []
+    for top, r in zip(tops, negatives):
+        if not top > 0:
+            raise ValueError(
+                "t cannot be estimated from a channel without positive values"
+            )
+        a = (
+            -np.arcsinh(r * np.sinh(m * np.log(10)) / top) / np.log(10)
+            if r < 0
+            else 0.0
+        )
+        parameters.append({"m": m, "t": float(top), "a": float(np.clip(a, 0, m))})
+    return parameters
+
+
+def from_data(
+    cls: type[Transform],
+    data,
+    rule: Callable[[QuantileSketch], list[dict]],
+    columns: list | None = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    **kwargs,
+):
+    """
+    A transformer of class cls with parameters estimated from data by rule: an instance of cls for
+    1-D data, otherwise a MultiChannelTransform with parameters per channel. kwargs are passed on to
+    the transformer(s).
+    """
+    from .multichannel import MultiChannelTransform
+
+    channels, result = sketch(data, columns, chunk_rows, kwargs.get("n_jobs", -1))
+    parameters = rule(result)
+    if channels is None:
+        return cls(**parameters[0], **kwargs)
+    options = {k: v for k, v in kwargs.items() if k in _MULTICHANNEL_OPTIONS}
+    channel_options = {k: v for k, v in kwargs.items() if k not in options}
+    return MultiChannelTransform(
+        cls,
+        {
+            channel: {**params, **channel_options}
+            for channel, params in zip(channels, parameters)
+        },
+        **options,
+    )
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import math
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor as PoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Iterable
+
+if TYPE_CHECKING:  # pragma: no cover
+    from concurrent.futures import ProcessPoolExecutor
+
+CGROUP = Path("/sys/fs/cgroup")
+
+
+def cpu_count() -> int:
+    """
+    Number of CPUs this process can use: those it may run on, capped by any cgroup CPU quota (as set
+    by container runtimes and batch schedulers).
+    """
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - not available on macOS and Windows
+        count = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    return max(1, min(count, math.ceil(quota))) if quota else count
+
+
+def _cgroup_cpu_quota() -> float | None:
+    """
+    CPUs allowed by the cgroup CPU quota of this process, or None if there is no quota.
+    """
+    try:  # cgroup v2
+        quota, period = (CGROUP / "cpu.max").read_text().split()
+    except (OSError, ValueError):
+        try:  # cgroup v1
+            quota = (CGROUP / "cpu" / "cpu.cfs_quota_us").read_text().strip()
+            period = (CGROUP / "cpu" / "cpu.cfs_period_us").read_text().strip()
+        except OSError:
+            return None
+    if quota in ("max", "-1"):
+        return None
+    return int(quota) / int(period)
+
+
+class Executor(ABC):
+    """
+    Runs batches of work for a Transform. Pools are created on first use and then kept for the
+    lifetime of the executor, so repeated calls to transform do not pay for pool start-up.
+
+    Executors that share memory with the caller (serial and threads) let workers write directly into
+    a preallocated output array; the others return each batch result to be copied into place.
+    """
+
+    kind: str = "threads"
+    shares_memory: bool = True
+
+    def __init__(self, n_jobs: int = -1):
+        self.n_jobs: int = n_jobs if n_jobs > 0 else cpu_count()
+        self._pool: PoolExecutor | None = None
+
+    @abstractmethod
+    def _create_pool(self) -> PoolExecutor | None:
+        ...
+
+    @property
+    def pool(self) -> PoolExecutor | None:
+        if self._pool is None:
+            self._pool = self._create_pool()
+        return self._pool
+
+    def map(self, func: Callable, items: Iterable) -> list[Any]:
+        """
+        Apply func to each item and return the results in order.
+
+        Parameters
+        ----------
+        func: Callable
+            Function of a single argument.
+        items: Iterable
+            Arguments to apply func to.
+
+        Returns
+        -------
+        list
+            Results of func, in the same order as items.
+        """
+        items = list(items)
+        if len(items) <= 1 or self.pool is None:
+            return [func(item) for item in items]
+        return list(self.pool.map(func, items))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        return state
+
+    def __repr__(self):
+        return f"{type(self).__name__}(n_jobs={self.n_jobs})"
+
+
+class SerialExecutor(Executor):
+    kind = "serial"
+
+    def __init__(self, n_jobs: int = 1):
+        super().__init__(n_jobs=1)
+
+    def _create_pool(self) -> None:
+        return None
+
+
+class ThreadExecutor(Executor):
+    def _create_pool(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=self.n_jobs)
+
+
+class ProcessExecutor(Executor):
+    kind = "processes"
+    shares_memory = False
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        # imported here as it pulls in multiprocessing, which few calls need
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # workers are started from a clean server process rather than forked from this one, which
+        # may already be running threads (thread pools, numba's parallel backend) whose locks a
+        # forked child would inherit held and deadlock on
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context(
+            "forkserver" if "forkserver" in methods else None
+        )
+        return ProcessPoolExecutor(max_workers=self.n_jobs, mp_context=context)
+
+
+class AutoExecutor(Executor):
+    """
+    Lets the transformer's cost model choose, for each call, whether to run serially, in threads or
+    in processes. Each kind of executor is created when first chosen and then kept.
+    """
+
+    kind = "auto"
+
+    def __init__(self, n_jobs: int = -1):
+        super().__init__(n_jobs=n_jobs)
+        self._executors: dict[str, Executor] = {}
+
+    def _create_pool(self) -> None:
+        return None
+
+    def get(self, kind: str) -> Executor:
+        """
+        The executor of the given kind ("serial", "threads" or "processes").
+        """
+        if kind not in self._executors:
+            self._executors[kind] = get_executor(kind, n_jobs=self.n_jobs)
+        return self._executors[kind]
+
+    def shutdown(self):
+        for executor in self._executors.values():
+            executor.shutdown()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["_executors"] = {}
+        return state
+
+
+EXECUTORS: dict[str, type[Executor]] = {
+    "auto": AutoExecutor,
+    "serial": SerialExecutor,
+    "threads": ThreadExecutor,
+    "processes": ProcessExecutor,
+}
+
+
+def get_executor(executor: str | Executor, n_jobs: int = -1) -> Executor:
+    """
+    Resolve an executor name ("auto", "serial", "threads" or "processes") to an Executor. Executor
+    instances are returned as is, so that one pool can be shared between transformers.
+    An n_jobs of 0 or 1 always gives a serial executor.
+    """
+    if isinstance(executor, Executor):
+        return executor
+    if executor not in EXECUTORS:
+        raise ValueError(f"executor must be one of {', '.join(EXECUTORS)}")
+    if n_jobs in [0, 1]:
+        return SerialExecutor()
+    return EXECUTORS[executor](n_jobs=n_jobs)
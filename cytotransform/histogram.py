@@ -0,0 +1,52 @@
+import numpy as np
+
+from .base import Transform, bin_dtype
+
+# events binned at a time, bounding the memory used for bin indices
+CHUNK_EVENTS = 1 << 20
+
+
+def histogram2d(
+    x: np.ndarray,
+    y: np.ndarray,
+    transform_x: Transform,
+    transform_y: Transform | None = None,
+    n_bins: int = 256,
+) -> np.ndarray:
+    """
+    Count raw events in an n_bins x n_bins grid of the transformed space, e.g. for a density plot of
+    two channels. Events are binned straight to integer bin indices (see Transform.transform with
+    output="bins") a chunk at a time and counted with a single bincount, without ever materialising
+    the transformed values.
+
+    Parameters
+    ----------
+    x: np.ndarray
+        Raw values of the first channel.
+    y: np.ndarray
+        Raw values of the second channel, of the same length as x.
+    transform_x: Transform
+        Transformer for x.
+    transform_y: Transform, optional
+        Transformer for y, by default transform_x.
+    n_bins: int
+        Number of bins along each axis, spanning [0, 1] of the transformed scales.
+
+    Returns
+    -------
+    np.ndarray
+        Counts of shape (n_bins, n_bins), indexed by the bins of x then of y.
+    """
+    x, y = np.ravel(x), np.ravel(y)
+    if x.shape != y.shape:
+        raise ValueError("x and y must have the same number of events")
+    bin_dtype(n_bins)
+    transform_y = transform_y or transform_x
+    counts = np.zeros(n_bins * n_bins, dtype=np.int64)
+    for start in range(0, x.size, CHUNK_EVENTS):
+        chunk = slice(start, start + CHUNK_EVENTS)
+        index = transform_x.transform(x[chunk], output="bins", n_bins=n_bins)
+        index = index.astype(np.intp) * n_bins
+        index += transform_y.transform(y[chunk], output="bins", n_bins=n_bins)
+        counts += np.bincount(index, minlength=counts.size)
+    return counts.reshape(n_bins, n_bins)
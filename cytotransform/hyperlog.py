@@ -1,12 +1,23 @@
-from functools import cache
+import sys
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from typing import Callable
 
 import numpy as np
-from scipy.optimize import newton
 
-from .base import Transform
+from . import jit
+from .base import FLOAT_DTYPES, CompiledTransform, Transform, blockwise, float_dtype
+from .executor import Executor
 
+TABLE_SIZE = 16385
+MAX_ITER = 20
+# smallest W estimated from data: hyperlog needs W > 0, and its scale distorts as W approaches 0
+MIN_W = 0.1
+# number of parameter sets whose tables of initial guesses are kept, per process
+CACHE_SIZE = 32
 
-@cache
+
+@lru_cache(maxsize=CACHE_SIZE)
 def intermediates(t_: int, w_: float, m_: float, a_: float):
     w = w_ / (m_ + a_)
     x2 = a_ / (m_ + a_)
@@ -22,36 +33,232 @@ def intermediates(t_: int, w_: float, m_: float, a_: float):
     return a, b, c, f
 
 
-def hyperlog(x: np.ndarray, t_: int, w_: float, m_: float, a_: float) -> np.ndarray:
-    x = np.asarray(x)
+@lru_cache(maxsize=CACHE_SIZE)
+def guess_table(t_: int, w_: float, m_: float, a_: float):
+    """
+    Tabulate the hyperlog on a grid that is evenly spaced in u = arcsinh(x / f), over the data range
+    that maps to scale values in [-1, 2]. In u the hyperlog is close to linear in both its linear and
+    logarithmic regions, so an initial guess needs only O(1) arithmetic per element.
+    """
     a, b, c, f = intermediates(t_, w_, m_, a_)
+    y = np.linspace(-1.0, 2.0, 16 * TABLE_SIZE)
+    u = np.arcsinh(inverse_hyperlog(y, t_, w_, m_, a_) / f)
+    u_grid = np.linspace(u[0], u[-1], TABLE_SIZE)
+    y_grid = np.interp(u_grid, u, y)
+    step = u_grid[1] - u_grid[0]
+    slope = np.append(np.diff(y_grid), 0.0)
+    return u_grid[0], step, y_grid, slope
+
+
+def _initial_guess(
+    x: np.ndarray,
+    coefficients: tuple,
+    table: tuple,
+    out: np.ndarray | None = None,
+):
+    a, b, c, f = coefficients
+    u0, step, y_grid, slope = table
+    position = np.divide(x, f)
+    np.arcsinh(position, out=position)
+    position -= u0
+    position /= step
+    # fmax/fmin rather than clip so that NaN maps to a valid index (and stays NaN in y)
+    index = np.fmin(np.fmax(position, 0), TABLE_SIZE - 1).astype(np.intp)
+    y = np.subtract(position, index, out=out)
+    y *= slope[index]
+    y += y_grid[index]
+    # outside the table one term of EH dominates, so invert that term alone
+    below = position < 0
+    y[below] = (x[below] + f) / c
+    above = position > TABLE_SIZE - 1
+    y[above] = np.log((x[above] + f) / a) / b
+    return y
 
-    def _eh(y):
-        return a * np.exp(b * y) + c * y - f
 
-    def d_eh(y):
-        return a * b * np.exp(b * y) + c
+def _halley_step(
+    y: np.ndarray, x: np.ndarray, a: float, b: float, c: float, f: float
+) -> np.ndarray:
+    """
+    Apply one Halley iteration for EH(y) = x to y in place and return the step taken.
+    """
+    ae = np.exp(b * y)
+    ae *= a
+    dg = b * ae
+    dg += c
+    # Newton step...
+    delta = c * y
+    delta += ae
+    delta -= f
+    delta -= x
+    delta /= dg
+    # ...corrected by Halley's factor, damped where the guess is still far from the root
+    ae *= delta
+    ae *= -0.5 * b
+    ae /= dg
+    ae += 1
+    delta /= np.maximum(ae, 0.5, out=ae)
+    y -= delta
+    return delta
+
 
-    return np.asarray(newton(_eh, x, fprime=d_eh))
+def _tolerance(b: float) -> float:
+    return np.cbrt(sys.float_info.epsilon / b**2)
 
 
-def inverse_hyperlog(x: np.ndarray, t_: int, w_: float, m_: float, a_: float) -> np.ndarray:
+def _hyperlog_block(
+    x: np.ndarray, y: np.ndarray, coefficients: tuple, table: tuple, tolerance: float
+):
+    a, b, c, f = coefficients
+    # the solver always runs in float64 (on one block, so this costs little memory); near the seam
+    # between the linear and exponential terms of EH, float32 cancellation stalls convergence
+    result = y
+    x = np.asarray(x, dtype=np.float64)
+    if y.dtype != np.float64:
+        y = np.empty(y.shape, dtype=np.float64)
+    with np.errstate(invalid="ignore", over="ignore"):
+        _initial_guess(x, coefficients, table, out=y)
+        delta = _halley_step(y, x, a, b, c, f)
+        active = np.flatnonzero(np.abs(delta) > tolerance * (1 + np.abs(y)))
+        for _ in range(MAX_ITER - 1):
+            if active.size == 0:
+                break
+            ya = y[active]
+            delta = _halley_step(ya, x[active], a, b, c, f)
+            y[active] = ya
+            active = active[np.abs(delta) > tolerance * (1 + np.abs(ya))]
+    np.copyto(y, x, where=np.isinf(x))
+    if result is not y:
+        result[...] = y
+
+
+def hyperlog(
+    x: np.ndarray,
+    t_: int,
+    w_: float,
+    m_: float,
+    a_: float,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Hyperlog transform, solving EH(y) = a * exp(b * y) + c * y - f = x for y. Initial guesses are
+    interpolated from a cached table, then refined with vectorised Halley iterations on the elements
+    that have not yet converged. Halley's method converges cubically, so an element is done once its
+    step is small enough that the error remaining after it is below double precision.
+
+    The solver runs blockwise, writing into out (which may be x itself) if given. The result has the
+    dtype of out, or float32 for float32 input and float64 otherwise.
+    """
+    coefficients = intermediates(t_, w_, m_, a_)
+    kernel = partial(
+        _hyperlog_block,
+        coefficients=coefficients,
+        table=guess_table(t_, w_, m_, a_),
+        tolerance=_tolerance(coefficients[1]),
+    )
+    return blockwise(kernel, x, out)
+
+
+def _inverse_hyperlog_block(x: np.ndarray, y: np.ndarray, coefficients: tuple):
+    a, b, c, f = coefficients
+    exponential = np.multiply(x, b, dtype=y.dtype)
+    np.exp(exponential, out=exponential)
+    exponential *= a
+    np.multiply(x, c, out=y, dtype=y.dtype)
+    y -= f
+    y += exponential
+
+
+def _inverse_kernels(coefficients: tuple) -> dict:
+    # one kernel per dtype, with the coefficients cast to that dtype
+    return {
+        dtype: partial(
+            _inverse_hyperlog_block,
+            coefficients=tuple(dtype.type(v) for v in coefficients),
+        )
+        for dtype in FLOAT_DTYPES
+    }
+
+
+def inverse_hyperlog(
+    x: np.ndarray,
+    t_: int,
+    w_: float,
+    m_: float,
+    a_: float,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
     x = np.asarray(x)
-    a, b, c, f = intermediates(t_, w_, m_, a_)
-    return a * np.exp(b * x) + c * x - f
+    kernel = _inverse_kernels(intermediates(t_, w_, m_, a_))[float_dtype(x, out)]
+    return blockwise(kernel, x, out)
+
+
+@dataclass(frozen=True)
+class HyperlogPlan(CompiledTransform):
+    """
+    Compiled hyperlog transform, holding the coefficients of EH, the solver tolerance, the table of
+    initial guesses and the blockwise kernels built from them. With the numba backend each element is
+    solved in a single parallel loop instead.
+    """
+
+    _transient = ("forward_kernel", "inverse_kernels", "jit_arguments")
+
+    t_: float
+    w_: float
+    m_: float
+    a_: float
+    backend: str = "numpy"
+    forward_kernel: Callable = field(init=False, repr=False, compare=False)
+    inverse_kernels: dict = field(init=False, repr=False, compare=False)
+    jit_arguments: tuple = field(init=False, repr=False, compare=False)
+    parallel: bool = field(default=False, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        coefficients = intermediates(self.t_, self.w_, self.m_, self.a_)
+        table = guess_table(self.t_, self.w_, self.m_, self.a_)
+        tolerance = _tolerance(coefficients[1])
+        self._set(
+            forward_kernel=partial(
+                _hyperlog_block,
+                coefficients=coefficients,
+                table=table,
+                tolerance=tolerance,
+            ),
+            inverse_kernels=_inverse_kernels(coefficients),
+            jit_arguments=(*coefficients, tolerance, *table),
+            parallel=self.backend == "numba",
+        )
+
+    def __call__(self, x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        if self.parallel:
+            return jit.apply("hyperlog", x, out, *self.jit_arguments)
+        return blockwise(self.forward_kernel, x, out)
+
+    def inverse(self, x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        if self.parallel:
+            return jit.apply("inverse_hyperlog", x, out, *self.jit_arguments[:4])
+        x = np.asarray(x)
+        return blockwise(self.inverse_kernels[float_dtype(x, out)], x, out)
 
 
 class HyperlogTransform(Transform):
     """
+    Hyperlog transform, solving the inverse of the function EH (linear near zero and logarithmic for
+    large values) for each element, as originally published in the following paper:
 
+    Bagwell CB. Hyperlog-a flexible log-like transform for negative, zero, and positive valued data.
+    Cytometry A. 2005 Mar;64(1):34-42. doi: 10.1002/cyto.a.20114. PMID: 15700280.
     """
+
     def __init__(
-            self,
-            w: float = 1.0,
-            m: float = 4.5,
-            t: int = 262144,
-            a: float = 0.0,
-            n_jobs: int = -1
+        self,
+        w: float = 1.0,
+        m: float = 4.5,
+        t: int = 262144,
+        a: float = 0.0,
+        n_jobs: int = -1,
+        executor: str | Executor = "auto",
+        dtype: str | np.dtype | None = None,
+        backend: str = "numpy",
     ):
         """
         Parameters
@@ -74,25 +281,96 @@ class HyperlogTransform(Transform):
             The number of such decades in the approximately linear region or "lower asymptote".
         a: float
              The number of additional decades of negative data values to be included.
+        n_jobs: int
+            Number of parallel workers, -1 uses all available cores and 0 or 1 runs serially.
+        executor: str | Executor
+            How batches are run in parallel: "threads", "processes" or "serial", or an Executor
+            instance to share one worker pool between transformers. The default, "auto", picks
+            for each call whichever of these a calibrated cost model predicts to be fastest.
+        dtype: str | np.dtype, optional
+            Compute (and return) float32 or float64. By default float32 input stays float32 and
+            anything else is computed in float64.
+        backend: str
+            "numpy", or "numba" to run each transform as a single compiled parallel loop (which
+            falls back to "numpy" if numba is not installed).
         """
+        self.backend = jit.resolve_backend(backend)
         super().__init__(
             transform_function=hyperlog,
             inverse_transform_function=inverse_hyperlog,
-            parameters={
-                'w_': w,
-                't_': t,
-                'm_': m,
-                'a_': a
-            },
-            n_jobs=n_jobs
+            parameters={"w_": w, "t_": t, "m_": m, "a_": a},
+            n_jobs=n_jobs,
+            executor=executor,
+            dtype=dtype,
         )
 
+    @classmethod
+    def from_data(
+        cls,
+        data,
+        columns: list | None = None,
+        m: float = 4.5,
+        t: float | None = None,
+        a: float = 0.0,
+        q: float = 0.05,
+        chunk_rows: int = 1 << 18,
+        **kwargs,
+    ):
+        """
+        A hyperlog transform with parameters estimated from data by the rule of Parks, Roederer and
+        Moore: T is the largest value and W = (M - log10(T / |r|)) / 2, with r the q quantile of the
+        negative values (see cytotransform.estimate), but at least MIN_W. The data is read once,
+        chunk by chunk, into a quantile sketch rather than sorted, so it does not need to fit in
+        memory.
+
+        Parameters
+        ----------
+        data: np.ndarray | pd.DataFrame | FCSFile | str | os.PathLike | Iterable
+            One channel (1-D array) or several (2-D array, DataFrame, FCS file), a path to a .npy,
+            FCS or Parquet file, or an iterable of chunks (arrays or DataFrames) of the data.
+        columns: list, optional
+            Channels to estimate parameters for, by name or position, by default all of them.
+        m: float
+            Number of decades of the scale.
+        t: float, optional
+            Top of the scale, by default the largest value of each channel.
+        a: float
+            Additional decades of negative values.
+        q: float
+            Quantile of the negative values that the scale reaches down to.
+        chunk_rows: int
+            Number of rows read at a time.
+        kwargs:
+            Other arguments of the transformer (n_jobs, executor, dtype, backend).
+
+        Returns
+        -------
+        HyperlogTransform | MultiChannelTransform
+            A transformer for 1-D data, otherwise a MultiChannelTransform with parameters per
+            channel.
+        """
+        from . import estimate
+
+        rule = partial(
+            estimate.negative_rule_parameters, m=m, t=t, a=a, q=q, min_w=MIN_W
+        )
+        return estimate.from_data(cls, data, rule, columns, chunk_rows, **kwargs)
+
+    def compile(self) -> HyperlogPlan:
+        return HyperlogPlan(**self.parameters, backend=self.backend)
+
     def validation(self):
-        if not self.parameters['t_'] > 0:
-            raise ValueError('t must be strictly positive')
-        if not self.parameters['m_'] > 0:
-            raise ValueError('m must be strictly positive')
-        if not 0 < self.parameters['w_'] <= self.parameters['m_']/2:
-            raise ValueError('w must be strictly positive and less than or equal to half m')
-        if not -self.parameters['w_'] <= self.parameters['a_'] <= (self.parameters['m_'] - 2 * self.parameters['w_']):
+        if not self.parameters["t_"] > 0:
+            raise ValueError("t must be strictly positive")
+        if not self.parameters["m_"] > 0:
+            raise ValueError("m must be strictly positive")
+        if not 0 < self.parameters["w_"] <= self.parameters["m_"] / 2:
+            raise ValueError(
+                "w must be strictly positive and less than or equal to half m"
+            )
+        if (
+            not -self.parameters["w_"]
+            <= self.parameters["a_"]
+            <= (self.parameters["m_"] - 2 * self.parameters["w_"])
+        ):
             raise ValueError("a must respect the relationship '−W ≤ A ≤ M − 2W'")
@@ -0,0 +1,242 @@
+import os
+from typing import Iterator
+
+import numpy as np
+
+HEADER_SIZE = 58
+BYTE_ORDERS = {"1,2,3,4": "<", "1,2": "<", "4,3,2,1": ">", "2,1": ">"}
+INT_WIDTHS = (8, 16, 32, 64)
+
+
+def _header_offsets(header: bytes) -> tuple[int, int, int, int]:
+    """
+    TEXT and DATA segment offsets (first and last byte) from the HEADER segment.
+    """
+    fields = [header[start : start + 8].strip() for start in range(10, 42, 8)]
+    return tuple(int(field) if field else 0 for field in fields)
+
+
+def parse_text(segment: bytes) -> dict[str, str]:
+    """
+    Keyword/value pairs of an FCS TEXT segment. The first byte is the delimiter, which appears doubled
+    within keywords and values; keywords are returned upper case.
+
+    Parameters
+    ----------
+    segment: bytes
+        TEXT segment, from its delimiter to its last byte.
+
+    Returns
+    -------
+    dict[str, str]
+        Values by keyword.
+    """
+    text = segment.decode("utf-8", errors="replace")
+    if not text:
+        raise ValueError("empty TEXT segment")
+    # padding after the final delimiter is not part of the last value
+    delimiter, text = text[0], text[1:].rstrip(" \0\r\n")
+    if text.endswith(delimiter) and not text.endswith(2 * delimiter):
+        text = text[:-1]
+    # doubled delimiters are literal, so they are swapped out before splitting
+    parts = [
+        part.replace("\0", delimiter)
+        for part in text.replace(2 * delimiter, "\0").split(delimiter)
+    ]
+    if len(parts) % 2:
+        raise ValueError("TEXT segment has a keyword without a value")
+    return {key.strip().upper(): value for key, value in zip(parts[::2], parts[1::2])}
+
+
+class FCSFile:
+    """
+    An FCS (2.0, 3.0 or 3.1) list mode file whose DATA segment is memory mapped rather than read:
+    data is a zero-copy view of the events as stored, a 2-D (events x channels) array when every
+    channel has the same type and width (float32, float64 or one integer width, in either byte order)
+    and otherwise a 1-D structured array with a field per channel. Events are only read from disk as
+    they are accessed.
+
+    Transformers accept an FCSFile directly (transform, inverse_transform and transform_file), reading
+    and transforming it a chunk of rows at a time, so no intermediate DataFrame or full copy of the
+    raw events is made.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        """
+        Parameters
+        ----------
+        path: str | os.PathLike
+            Path to the FCS file.
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE or not header.startswith(b"FCS"):
+                raise ValueError(f"{path} is not an FCS file")
+            self.version: str = header[:6].decode("ascii")
+            text_start, text_end, data_start, data_end = _header_offsets(header)
+            f.seek(text_start)
+            self.text: dict[str, str] = parse_text(f.read(text_end - text_start + 1))
+        if data_start == 0 and data_end == 0:
+            # segments beyond 99,999,999 bytes are only given in TEXT
+            data_start = int(self.text.get("$BEGINDATA", 0))
+            data_end = int(self.text.get("$ENDDATA", -1))
+        if self.text.get("$MODE", "L") != "L":
+            raise ValueError("only list mode ($MODE L) FCS files are supported")
+        n_channels = int(self.text["$PAR"])
+        self.channels: list[str] = [
+            self.text.get(f"$P{i}N", f"P{i}") for i in range(1, n_channels + 1)
+        ]
+        dtypes = self._channel_dtypes(n_channels)
+        uniform = len(set(dtypes)) == 1
+        if uniform:
+            row_size = n_channels * dtypes[0].itemsize
+        else:
+            row = np.dtype([(f"P{i}", dtype) for i, dtype in enumerate(dtypes, 1)])
+            row_size = row.itemsize
+        size = data_end - data_start + 1
+        n_events = int(self.text.get("$TOT", size // row_size))
+        if n_events * row_size > size:
+            raise ValueError(
+                f"DATA segment holds {size} bytes, too few for $TOT={n_events} events"
+            )
+        self.data: np.ndarray = np.memmap(
+            path,
+            dtype=dtypes[0] if uniform else row,
+            mode="r",
+            offset=data_start,
+            shape=(n_events, n_channels) if uniform else n_events,
+        )
+        # integer values are masked to the range of their channel when it takes fewer bits
+        self._masks = {
+            i: mask
+            for i, (dtype, mask) in enumerate(zip(dtypes, self._range_masks(dtypes)))
+            if dtype.kind == "u" and mask is not None
+        }
+
+    def _channel_dtypes(self, n_channels: int) -> list[np.dtype]:
+        datatype = self.text.get("$DATATYPE", "").upper()
+        byte_order = self.text.get("$BYTEORD", "1,2,3,4").replace(" ", "")
+        if byte_order not in BYTE_ORDERS:
+            raise ValueError(f"unsupported $BYTEORD {byte_order}")
+        order = BYTE_ORDERS[byte_order]
+        if datatype in ("F", "D"):
+            return [np.dtype(f"{order}f{4 if datatype == 'F' else 8}")] * n_channels
+        if datatype != "I":
+            raise ValueError(f"unsupported $DATATYPE {datatype or None}")
+        dtypes = []
+        for i in range(1, n_channels + 1):
+            bits = int(self.text[f"$P{i}B"])
+            if bits not in INT_WIDTHS:
+                raise ValueError(f"unsupported $P{i}B {bits}, only whole bytes")
+            dtypes.append(np.dtype(f"{order}u{bits // 8}"))
+        return dtypes
+
+    def _range_masks(self, dtypes: list[np.dtype]) -> list[int | None]:
+        masks = []
+        for i, dtype in enumerate(dtypes, 1):
+            value = self.text.get(f"$P{i}R")
+            try:
+                value = int(float(value)) if value is not None else 0
+            except ValueError:
+                value = 0
+            power_of_two = value > 0 and value & (value - 1) == 0
+            masks.append(
+                value - 1 if power_of_two and value < 1 << 8 * dtype.itemsize else None
+            )
+        return masks
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.data), len(self.channels)
+
+    @property
+    def dtype(self) -> np.dtype:
+        """
+        Native dtype holding every channel's values.
+        """
+        dtypes = (
+            [field[0] for field in self.data.dtype.fields.values()]
+            if self.data.dtype.names
+            else [self.data.dtype]
+        )
+        return np.result_type(*[dtype.newbyteorder("=") for dtype in dtypes])
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def channel_index(self, channels: list | None = None) -> list[int]:
+        """
+        Positions of channels, given by name ($PnN) or position, by default all of them.
+        """
+        if channels is None:
+            return list(range(len(self.channels)))
+        index = []
+        for channel in channels:
+            if isinstance(channel, (int, np.integer)):
+                if not 0 <= channel < len(self.channels):
+                    raise IndexError(f"channel {channel} out of range")
+                index.append(int(channel))
+            elif channel in self.channels:
+                index.append(self.channels.index(channel))
+            else:
+                raise KeyError(f"no channel {channel} in {self.path}")
+        return index
+
+    def read(
+        self,
+        rows: slice = slice(None),
+        channels: list | None = None,
+        dtype: np.dtype | str | type | None = None,
+    ) -> np.ndarray:
+        """
+        Values of some rows and channels as a native, C-ordered array: this reads them from disk.
+
+        Parameters
+        ----------
+        rows: slice
+            Rows (events) to read, by default all of them.
+        channels: list, optional
+            Channels to read, by name or position, by default all of them.
+        dtype: np.dtype, optional
+            dtype of the result, by default self.dtype.
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (rows, channels).
+        """
+        index = self.channel_index(channels)
+        dtype = np.dtype(dtype or self.dtype)
+        # a plain view, so that copies of it are not np.memmap instances
+        data = np.asarray(self.data[rows])
+        if self.data.dtype.names or self._masks:
+            out = np.empty((len(data), len(index)), dtype=dtype)
+            for j, i in enumerate(index):
+                out[:, j] = self._column(data, i)
+            return out
+        if index == list(range(len(self.channels))):
+            return data.astype(dtype)
+        return data[:, index].astype(dtype, copy=False)
+
+    def _column(self, data: np.ndarray, i: int) -> np.ndarray:
+        values = data[self.data.dtype.names[i]] if self.data.dtype.names else data[:, i]
+        # integer values are masked before any conversion to float loses their low bits
+        return values & self._masks[i] if i in self._masks else values
+
+    def chunks(
+        self,
+        chunk_rows: int,
+        channels: list | None = None,
+        dtype: np.dtype | str | type | None = None,
+    ) -> Iterator[tuple[int, np.ndarray]]:
+        """
+        Consecutive chunks of at most chunk_rows rows (see read), with their first row.
+        """
+        if chunk_rows < 1:
+            raise ValueError("chunk_rows must be a positive integer")
+        for start in range(0, len(self), chunk_rows):
+            yield start, self.read(slice(start, start + chunk_rows), channels, dtype)
+
+    def __repr__(self):
+        return f"FCSFile({self.path!r}, version={self.version}, shape={self.shape})"
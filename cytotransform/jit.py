@@ -0,0 +1,211 @@
+"""
+Optional Numba kernels. Each transform is a single parallel loop over the data, computing one element
+completely (including the Halley iterations of the hyperlog and logicle solvers) before moving on to
+the next, rather than the several whole-array passes of the NumPy implementations.
+
+Numba is an optional dependency; when it is not installed AVAILABLE is False and the transforms use
+their NumPy implementations instead. Kernels are compiled on first use and cached on disk.
+"""
+import math
+import sys
+from functools import cache
+from importlib.util import find_spec
+
+import numpy as np
+
+from .base import _memory_order, float_dtype
+
+# numba is slow to import, so it is only imported when the first kernel is compiled
+AVAILABLE = find_spec("numba") is not None
+numba = None
+MAX_ITER = 20
+EPSILON = sys.float_info.epsilon
+# out of range policies of the logicle kernels, in the order of logicle.OUT_OF_RANGE
+CLIP, NAN, EXTRAPOLATE = range(3)
+
+
+def _asinh(x, out, pre_scale, transpose, divisor):
+    for i in numba.prange(x.size):
+        out[i] = (math.asinh(x[i] * pre_scale) + transpose) / divisor
+
+
+def _inverse_asinh(x, out, pre_scale, transpose, divisor):
+    for i in numba.prange(x.size):
+        out[i] = math.sinh(x[i] * divisor - transpose) / pre_scale
+
+
+def _log(x, out, t, m):
+    for i in numba.prange(x.size):
+        out[i] = math.log10(x[i] / t) / m + 1
+
+
+def _inverse_log(x, out, t, m):
+    for i in numba.prange(x.size):
+        out[i] = 10.0 ** ((x[i] - 1) * m) * t
+
+
+def _hyperlog(x, out, a, b, c, f, tolerance, u0, step, y_grid, slope):
+    last = y_grid.size - 1
+    for i in numba.prange(x.size):
+        value = float(x[i])
+        if math.isinf(value) or math.isnan(value):
+            out[i] = value
+            continue
+        # initial guess interpolated from the table, evenly spaced in u = arcsinh(x / f)
+        position = (math.asinh(value / f) - u0) / step
+        if position < 0:
+            y = (value + f) / c
+        elif position > last:
+            y = math.log((value + f) / a) / b
+        else:
+            j = int(position)
+            y = y_grid[j] + (position - j) * slope[j]
+        # Halley iterations for EH(y) = a * exp(b * y) + c * y - f = value
+        for _ in range(MAX_ITER):
+            ae = a * math.exp(b * y)
+            dg = b * ae + c
+            delta = (ae + c * y - f - value) / dg
+            delta /= max(1 - 0.5 * b * ae * delta / dg, 0.5)
+            y -= delta
+            if abs(delta) <= tolerance * (1 + abs(y)):
+                break
+        out[i] = y
+
+
+def _inverse_hyperlog(x, out, a, b, c, f):
+    for i in numba.prange(x.size):
+        out[i] = a * math.exp(b * x[i]) + c * x[i] - f
+
+
+def _series(scale, x1, taylor):
+    # Taylor series of the biexponential around x1; taylor[1] is identically zero
+    x = scale - x1
+    total = taylor[-1] * x
+    for k in range(taylor.size - 2, 1, -1):
+        total = (total + taylor[k]) * x
+    return (total * x + taylor[0]) * x
+
+
+def _logicle(x, out, a, b, c, d, f, x1, x_taylor, taylor, lower, upper, policy):
+    for i in numba.prange(x.size):
+        value = float(x[i])
+        if math.isnan(value) or math.isinf(value) and policy == EXTRAPOLATE:
+            out[i] = value
+            continue
+        # data outside the range of the lookup table backends is clipped, made NaN or extrapolated
+        if policy == CLIP:
+            value = min(max(value, lower), upper)
+        elif policy == NAN and not lower <= value <= upper:
+            out[i] = math.nan
+            continue
+        if value == 0:
+            out[i] = x1
+            continue
+        negative = value < 0
+        if negative:
+            value = -value
+        # initial guess: linear in the quasi linear region, otherwise logarithmic
+        if value < f:
+            y = x1 + value / taylor[0]
+        else:
+            y = math.log(value / a) / b
+        tolerance = 3 * EPSILON * max(y, 1.0)
+        # Halley iterations for the biexponential, as in Logicle::scale
+        for _ in range(MAX_ITER):
+            ae2bx = a * math.exp(b * y)
+            ce2mdx = c / math.exp(d * y)
+            if y < x_taylor:
+                residual = _series(y, x1, taylor) - value
+            else:
+                residual = (ae2bx + f) - (ce2mdx + value)
+            abe2bx = b * ae2bx
+            cde2mdx = d * ce2mdx
+            dy = abe2bx + cde2mdx
+            ddy = b * abe2bx - d * cde2mdx
+            delta = residual / (dy * (1 - residual * ddy / (2 * dy * dy)))
+            y -= delta
+            if abs(delta) < tolerance:
+                break
+        out[i] = 2 * x1 - y if negative else y
+
+
+def _inverse_logicle(x, out, a, b, c, d, f, x1, x_taylor, taylor, policy):
+    for i in numba.prange(x.size):
+        scale = float(x[i])
+        if policy == CLIP:
+            scale = min(max(scale, 0.0), 1.0)
+        elif policy == NAN and not 0 <= scale <= 1:
+            out[i] = math.nan
+            continue
+        negative = scale < x1
+        if negative:
+            scale = 2 * x1 - scale
+        if scale < x_taylor:
+            value = _series(scale, x1, taylor)
+        else:
+            value = (a * math.exp(b * scale) + f) - c / math.exp(d * scale)
+        out[i] = -value if negative else value
+
+
+KERNELS = {
+    "asinh": _asinh,
+    "inverse_asinh": _inverse_asinh,
+    "log": _log,
+    "inverse_log": _inverse_log,
+    "hyperlog": _hyperlog,
+    "inverse_hyperlog": _inverse_hyperlog,
+    "logicle": _logicle,
+    "inverse_logicle": _inverse_logicle,
+}
+
+
+def resolve_backend(backend: str) -> str:
+    """
+    Check a backend name ("numpy" or "numba"), falling back to "numpy" when numba is not installed.
+    """
+    if backend not in ("numpy", "numba"):
+        raise ValueError("backend must be one of 'numpy' or 'numba'")
+    return backend if AVAILABLE else "numpy"
+
+
+@cache
+def kernel(name: str):
+    """
+    The compiled kernel of the given name, compiled on first use.
+    """
+    if not AVAILABLE:
+        raise ImportError("the numba backend requires numba")
+    _import_numba()
+    return numba.njit(parallel=True, cache=True)(KERNELS[name])
+
+
+def _import_numba():
+    # kernels find numba and the helpers they call as module globals when they are compiled
+    global numba, _series
+    if numba is None:
+        import numba
+
+        _series = numba.njit(cache=True)(_series)
+
+
+def apply(name: str, x: np.ndarray, out: np.ndarray | None, *constants) -> np.ndarray:
+    """
+    Run kernel name over x, writing into out (which may be x itself) if given. Computes in float64
+    and stores the result in the dtype of out, or float32 for float32 input and float64 otherwise.
+    """
+    x = np.asarray(x)
+    result = np.empty(x.shape, dtype=float_dtype(x, out)) if out is None else out
+    order = _memory_order(result)
+    flat_out = (
+        result.reshape(-1, order=order)
+        if order is not None
+        else np.empty(result.size, dtype=result.dtype)
+    )
+    # elementwise, so x only needs to be flattened in the same order as out
+    flat_x = np.ravel(x, order=order or "C")
+    if flat_x.dtype.kind != "f":
+        flat_x = flat_x.astype(np.float64)
+    kernel(name)(flat_x, flat_out, *constants)
+    if order is None:
+        result[...] = flat_out.reshape(result.shape)
+    return result
@@ -1,22 +1,89 @@
+from dataclasses import dataclass, field
+
 import numpy as np
 
-from .base import Transform
+from . import jit
+from .base import FLOAT_DTYPES, CompiledTransform, Transform, float_dtype
+from .executor import Executor
+
+
+def _log(x, out, dtype, t, m) -> np.ndarray:
+    out = np.divide(x, t, out=out, dtype=dtype)
+    np.log10(out, out=out)
+    out /= m
+    out += 1
+    return out
+
+
+def _inverse_log(x, out, dtype, t, m) -> np.ndarray:
+    out = np.subtract(x, 1, out=out, dtype=dtype)
+    out *= m
+    np.power(dtype.type(10), out, out=out)
+    out *= t
+    return out
 
 
-def parametrized_log(x: np.ndarray, m: float, t: int) -> np.ndarray:
+def _cast(t, m, dtype: np.dtype) -> tuple:
+    return np.asarray(t, dtype=dtype)[()], np.asarray(m, dtype=dtype)[()]
+
+
+def parametrized_log(
+    x: np.ndarray, m: float, t: int, out: np.ndarray | None = None
+) -> np.ndarray:
     """
-    Parametrized logarithmic transformation
+    Parametrized logarithmic transformation, optionally written into out (which may be x itself).
+    Computes in the dtype of out, or float32 for float32 input and float64 otherwise.
     """
     x = np.asarray(x)
-    return (1 / m) * np.log10(x / t) + 1.0
+    dtype = float_dtype(x, out)
+    return _log(x, out, dtype, *_cast(t, m, dtype))
 
 
-def inverse_parametrized_log(x: np.ndarray, m: float, t: int) -> np.ndarray:
+def inverse_parametrized_log(
+    x: np.ndarray, m: float, t: int, out: np.ndarray | None = None
+) -> np.ndarray:
     """
-    Inverse parametrized logarithmic transformation
+    Inverse parametrized logarithmic transformation, optionally written into out (which may be x itself).
+    Computes in the dtype of out, or float32 for float32 input and float64 otherwise.
     """
     x = np.asarray(x)
-    return t * (10 ** ((x - 1) * m))
+    dtype = float_dtype(x, out)
+    return _inverse_log(x, out, dtype, *_cast(t, m, dtype))
+
+
+@dataclass(frozen=True)
+class LogPlan(CompiledTransform):
+    """
+    Compiled parametrized logarithmic transform, with t and m cast to float32 and float64 once. With
+    the numba backend (and scalar parameters) it runs as a single parallel loop.
+    """
+
+    t: float | tuple
+    m: float | tuple
+    backend: str = "numpy"
+    constants: dict = field(init=False, repr=False, compare=False)
+    parallel: bool = field(default=False, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._set(
+            constants={dtype: _cast(self.t, self.m, dtype) for dtype in FLOAT_DTYPES},
+            parallel=self.backend == "numba"
+            and np.ndim(self.t) == np.ndim(self.m) == 0,
+        )
+
+    def __call__(self, x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        if self.parallel:
+            return jit.apply("log", x, out, *self.constants[FLOAT_DTYPES[1]])
+        x = np.asarray(x)
+        dtype = float_dtype(x, out)
+        return _log(x, out, dtype, *self.constants[dtype])
+
+    def inverse(self, x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        if self.parallel:
+            return jit.apply("inverse_log", x, out, *self.constants[FLOAT_DTYPES[1]])
+        x = np.asarray(x)
+        dtype = float_dtype(x, out)
+        return _inverse_log(x, out, dtype, *self.constants[dtype])
 
 
 class ParametrizedLogTransform(Transform):
@@ -24,7 +91,17 @@ class ParametrizedLogTransform(Transform):
     Parametrized logarithmic transformation
     """
 
-    def __init__(self, m: float = 4.5, t: int = 262144, n_jobs: int = -1):
+    broadcast_parameters = True
+
+    def __init__(
+        self,
+        m: float = 4.5,
+        t: int = 262144,
+        n_jobs: int = -1,
+        executor: str | Executor = "auto",
+        dtype: str | np.dtype | None = None,
+        backend: str = "numpy",
+    ):
         """
         Parameters
         ----------
@@ -40,7 +117,20 @@ class ParametrizedLogTransform(Transform):
             the dynamic range of the transformed data. A larger M value
             will result in a greater dynamic range and better separation
             of data points in the transformed space.
+        n_jobs: int
+            Number of parallel workers, -1 uses all available cores and 0 or 1 runs serially.
+        executor: str | Executor
+            How batches are run in parallel: "threads", "processes" or "serial", or an Executor
+            instance to share one worker pool between transformers. The default, "auto", picks
+            for each call whichever of these a calibrated cost model predicts to be fastest.
+        dtype: str | np.dtype, optional
+            Compute (and return) float32 or float64. By default float32 input stays float32 and
+            anything else is computed in float64.
+        backend: str
+            "numpy", or "numba" to run each transform as a single compiled parallel loop (which
+            falls back to "numpy" if numba is not installed).
         """
+        self.backend = jit.resolve_backend(backend)
         super().__init__(
             transform_function=parametrized_log,
             inverse_transform_function=inverse_parametrized_log,
@@ -49,8 +139,13 @@ class ParametrizedLogTransform(Transform):
                 "m": m,
             },
             n_jobs=n_jobs,
+            executor=executor,
+            dtype=dtype,
         )
 
+    def compile(self) -> LogPlan:
+        return LogPlan(**self.parameters, backend=self.backend)
+
     def validation(self):
         if not self.parameters["t"] > 0:
             raise ValueError("t must be strictly positive")
@@ -1,26 +1,518 @@
 import sys
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from typing import NamedTuple
 
 import numpy as np
 
-from logicle_ext import FastLogicle  # type: ignore
+from . import jit
+from .base import FLOAT_DTYPES, CompiledTransform, Transform, blockwise, float_dtype
+from .executor import Executor
 
-from .base import Transform
+try:
+    from logicle_ext import FastLogicle  # type: ignore
+except ImportError:  # pragma: no cover
+    FastLogicle = None
+
+DEFAULT_BINS = 1 << 12
+TAYLOR_LENGTH = 16
+MAX_ITER = 20
+OUT_OF_RANGE = ("clip", "nan", "extrapolate")
+# number of parameter sets whose lookup tables are kept, per process
+CACHE_SIZE = 32
+
+
+class LogicleCoefficients(NamedTuple):
+    """
+    Derived logicle constants (as in the logicle_params struct of the C++ implementation) together with
+    the lookup table of the inverse function sampled at bins + 1 evenly spaced scale values.
+    """
+
+    a: float
+    b: float
+    c: float
+    d: float
+    f: float
+    x1: float
+    x_taylor: float
+    taylor: np.ndarray
+    lookup: np.ndarray
+    bins: int
+
+
+def _solve(b: float, w: float) -> float:
+    """
+    Solve 2 * (ln(d) - ln(b)) + w * (b + d) = 0 for d using a safeguarded Newton's method (RTSAFE from
+    Numerical Recipes), as implemented in Logicle::solve.
+    """
+    # w == 0 means its really arcsinh
+    if w == 0:
+        return b
+    tolerance = 2 * b * sys.float_info.epsilon
+    d_lo, d_hi = 0.0, b
+    d = (d_lo + d_hi) / 2
+    last_delta = d_hi - d_lo
+    f_b = -2 * np.log(b) + w * b
+    f = 2 * np.log(d) + w * d + f_b
+    last_f = np.nan
+    for _ in range(1, 20):
+        df = 2 / d + w
+        if ((d - d_hi) * df - f) * ((d - d_lo) * df - f) >= 0 or abs(1.9 * f) > abs(
+            last_delta * df
+        ):
+            delta = (d_hi - d_lo) / 2
+            d = d_lo + delta
+            if d == d_lo:
+                return d
+        else:
+            delta = f / df
+            t = d
+            d -= delta
+            if d == t:
+                return d
+        if abs(delta) < tolerance:
+            return d
+        last_delta = delta
+        f = 2 * np.log(d) + w * d + f_b
+        if f == 0 or f == last_f:
+            return d
+        last_f = f
+        if f < 0:
+            d_lo = d
+        else:
+            d_hi = d
+    raise RuntimeError("exceeded maximum iterations in solve()")
+
+
+def _biexponential(coef: LogicleCoefficients, scale: np.ndarray) -> np.ndarray:
+    """
+    Exact (vectorised) logicle inverse, i.e. Logicle::inverse, using the Taylor series near data zero.
+    """
+    scale = np.asarray(scale, dtype=np.float64)
+    negative = scale < coef.x1
+    scale = np.where(negative, 2 * coef.x1 - scale, scale)
+    # Taylor series around x1; taylor[1] is identically zero by the logicle condition
+    x = scale - coef.x1
+    series = coef.taylor[-1] * x
+    for i in range(TAYLOR_LENGTH - 2, 1, -1):
+        series = (series + coef.taylor[i]) * x
+    series = (series * x + coef.taylor[0]) * x
+    with np.errstate(over="ignore"):
+        exact = (coef.a * np.exp(coef.b * scale) + coef.f) - coef.c / np.exp(
+            coef.d * scale
+        )
+    inverse = np.where(scale < coef.x_taylor, series, exact)
+    return np.where(negative, -inverse, inverse)
+
+
+def _logicle_exact(coef: LogicleCoefficients, x: np.ndarray) -> np.ndarray:
+    """
+    Exact (vectorised) logicle transform, i.e. Logicle::scale: Halley's method on the biexponential,
+    for any data value rather than only those within the lookup table. Used to extrapolate beyond the
+    table, so it is only run on the few values outside it.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    value = np.abs(x)
+    with np.errstate(all="ignore"):
+        # linear initial guess in the quasi linear region, otherwise logarithmic
+        y = np.where(
+            value < coef.f,
+            coef.x1 + value / coef.taylor[0],
+            np.log(value / coef.a) / coef.b,
+        )
+        tolerance = 3 * sys.float_info.epsilon * np.maximum(y, 1)
+        for _ in range(MAX_ITER):
+            ae2bx = coef.a * np.exp(coef.b * y)
+            ce2mdx = coef.c / np.exp(coef.d * y)
+            residual = np.where(
+                y < coef.x_taylor,
+                _biexponential(coef, y) - value,
+                (ae2bx + coef.f) - (ce2mdx + value),
+            )
+            abe2bx = coef.b * ae2bx
+            cde2mdx = coef.d * ce2mdx
+            dy = abe2bx + cde2mdx
+            ddy = coef.b * abe2bx - coef.d * cde2mdx
+            delta = residual / (dy * (1 - residual * ddy / (2 * dy * dy)))
+            y = y - np.nan_to_num(delta, nan=0.0)
+            if np.all(
+                np.abs(delta[np.isfinite(delta)]) < tolerance[np.isfinite(delta)]
+            ):
+                break
+    y = np.where(x < 0, 2 * coef.x1 - y, y)
+    y[x == 0] = coef.x1
+    y[np.isinf(x)] = x[np.isinf(x)]
+    y[np.isnan(x)] = np.nan
+    return y
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def logicle_coefficients(
+    t: float, w: float, m: float, a: float, bins: int = DEFAULT_BINS
+) -> LogicleCoefficients:
+    """
+    Compute the logicle constants and inverse lookup table for the given parameters. Mirrors
+    FastLogicle::initialize, including the adjustment of A that places data zero on a bin boundary.
+    The CACHE_SIZE most recently used parameter sets are cached.
+    """
+    zero = (w + a) / (m + a)
+    zero = np.floor(zero * bins + 0.5) / bins
+    a = (m * zero - w) / (1 - zero)
+
+    w_ = w / (m + a)
+    x2 = a / (m + a)
+    x1 = x2 + w_
+    x0 = x2 + 2 * w_
+    b = (m + a) * np.log(10)
+    d = _solve(b, w_)
+    c_a = np.exp(x0 * (b + d))
+    mf_a = np.exp(b * x1) - c_a / np.exp(d * x1)
+    a_ = t / ((np.exp(b) - mf_a) - c_a / np.exp(d))
+    c = c_a * a_
+    f = -mf_a * a_
+
+    pos_coef = a_ * np.exp(b * x1)
+    neg_coef = -c / np.exp(d * x1)
+    taylor = np.empty(TAYLOR_LENGTH)
+    for i in range(TAYLOR_LENGTH):
+        pos_coef *= b / (i + 1)
+        neg_coef *= -d / (i + 1)
+        taylor[i] = pos_coef + neg_coef
+    taylor[1] = 0
+    taylor.flags.writeable = False
+
+    coef = LogicleCoefficients(
+        a=a_,
+        b=b,
+        c=c,
+        d=d,
+        f=f,
+        x1=x1,
+        x_taylor=x1 + w_ / 4,
+        taylor=taylor,
+        lookup=np.empty(0),
+        bins=bins,
+    )
+    lookup = _biexponential(coef, np.arange(bins + 1) / bins)
+    lookup.flags.writeable = False
+    return coef._replace(lookup=lookup)
+
+
+@lru_cache(maxsize=2 * CACHE_SIZE)
+def lookup_table(t: float, w: float, m: float, a: float, dtype: np.dtype) -> np.ndarray:
+    """
+    The inverse lookup table of logicle_coefficients in the given dtype, cached so that float32 data
+    can be searched and interpolated against a float32 table.
+    """
+    lookup = logicle_coefficients(t, w, m, a).lookup.astype(dtype)
+    lookup.flags.writeable = False
+    return lookup
+
+
+def _logicle_block(x: np.ndarray, y: np.ndarray, lookup: np.ndarray):
+    bins = lookup.size - 1
+    np.clip(x, lookup[0], lookup[-1], out=y)
+    index = np.searchsorted(lookup, y, side="right")
+    index -= 1
+    np.clip(index, 0, bins - 1, out=index)
+    lower = lookup[index]
+    y -= lower
+    y /= np.subtract(lookup[index + 1], lower, out=lower)
+    y += index
+    y /= bins
+
+
+def _out_of_range_block(
+    x: np.ndarray,
+    y: np.ndarray,
+    kernel,
+    lower: float,
+    upper: float,
+    nan: bool,
+    exact,
+):
+    # kernel clips values outside [lower, upper], which then become NaN or are computed exactly
+    kernel(x, y)
+    outside = _outside(x, lower, upper)
+    if outside.any():
+        y[outside] = np.nan if nan else exact(x[outside])
+
+
+def _outside(x: np.ndarray, lower: float, upper: float) -> np.ndarray:
+    # values outside [lower, upper], not counting NaN
+    return (x < lower) | (x > upper)
+
+
+def logicle(
+    x: np.ndarray,
+    t: int,
+    w: float,
+    m: float,
+    a: float,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Pure NumPy logicle transform. Values are located in the inverse lookup table with np.searchsorted and
+    linearly interpolated between bins, exactly as FastLogicle::scale does, but for a whole array at once.
+    Values outside the range of the table are clipped to the bottom and top of the scale. The result is
+    written into out if given, which may be x itself, and computed in the dtype of out (or float32 for
+    float32 input and float64 otherwise).
+    """
+    x = np.asarray(x)
+    lookup = lookup_table(t, w, m, a, float_dtype(x, out))
+    return blockwise(partial(_logicle_block, lookup=lookup), x, out)
+
+
+def _inverse_logicle_block(x: np.ndarray, y: np.ndarray, lookup: np.ndarray):
+    bins = lookup.size - 1
+    np.clip(x, 0, 1, out=y)
+    y *= bins
+    # NaN gives an arbitrary index, which is clipped and interpolated to NaN below
+    with np.errstate(invalid="ignore"):
+        index = np.floor(y).astype(np.intp)
+    np.clip(index, 0, bins - 1, out=index)
+    # y becomes the interpolation weight, then the interpolated value
+    y -= index
+    upper = lookup[index + 1]
+    upper -= lookup[index]
+    y *= upper
+    y += lookup[index]
+
+
+def inverse_logicle(
+    x: np.ndarray,
+    t: int,
+    w: float,
+    m: float,
+    a: float,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Pure NumPy inverse logicle transform, linearly interpolating the lookup table as FastLogicle::inverse
+    does. Scale values outside [0, 1] are clipped to the ends of the scale. The result is
+    written into out if given, which may be x itself, and computed in the dtype of out (or float32 for
+    float32 input and float64 otherwise).
+    """
+    x = np.asarray(x)
+    lookup = lookup_table(t, w, m, a, float_dtype(x, out))
+    return blockwise(partial(_inverse_logicle_block, lookup=lookup), x, out)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def fast_logicle(
+    t: float, w: float, m: float, a: float, bins: int = DEFAULT_BINS
+) -> "FastLogicle":
+    """
+    FastLogicle for the given parameters. Building one computes bins + 1 inverse values for its lookup
+    table, so the CACHE_SIZE most recently used are cached and shared by the forward and inverse
+    wrappers and by thread workers. FastLogicle objects pickle with their lookup table, so sending one
+    to a process worker does not rebuild the table either.
+    """
+    if FastLogicle is None:
+        raise ImportError("logicle_ext is not available")
+    return FastLogicle(T=t, W=w, M=m, A=a, bins=bins)
+
+
+def _contiguous(x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Coerce input to a contiguous float32/float64 buffer accepted by the FastLogicle array methods, in
+    the dtype given by float_dtype.
+    """
+    x = np.asarray(x)
+    return np.ascontiguousarray(x, dtype=float_dtype(x, out))
+
+
+def _native_out(x: np.ndarray, out: np.ndarray | None) -> np.ndarray | None:
+    """
+    Return out if the FastLogicle array methods can write into it directly, otherwise None.
+    """
+    if out is not None and out.flags.c_contiguous and out.dtype == x.dtype:
+        return out
+    return None
+
+
+def _native_call(
+    method,
+    x: np.ndarray,
+    out: np.ndarray | None,
+    n_threads: int,
+    out_of_range: str,
+    count: bool,
+):
+    x = _contiguous(x, out)
+    buffer = _native_out(x, out)
+    result = method(
+        x,
+        out=buffer,
+        n_threads=n_threads,
+        out_of_range=out_of_range,
+        return_count=count,
+    )
+    if count:
+        result, n_outside = result
+    if out is not None and buffer is None:
+        out[...] = result
+        result = out
+    return (result, n_outside) if count else result
+
+
+def _native_scale(
+    fl: "FastLogicle",
+    x: np.ndarray,
+    out: np.ndarray | None = None,
+    n_threads: int = 1,
+    out_of_range: str = "clip",
+    count: bool = False,
+):
+    """
+    FastLogicle scale of an array, written into out if given. Values outside the lookup table are
+    handled according to out_of_range inside the extension, so no separate clipping pass is needed;
+    with count, the number of such values is returned with the result.
+    """
+    return _native_call(fl.scale_array, x, out, n_threads, out_of_range, count)
+
+
+def _native_inverse(
+    fl: "FastLogicle",
+    x: np.ndarray,
+    out: np.ndarray | None = None,
+    n_threads: int = 1,
+    out_of_range: str = "clip",
+    count: bool = False,
+):
+    """
+    FastLogicle inverse of an array of scale values, handling values outside [0, 1] as _native_scale
+    does those outside the lookup table.
+    """
+    return _native_call(fl.inverse_array, x, out, n_threads, out_of_range, count)
 
 
 def fastlogicle_wrapper(
-    x: np.ndarray, t: int, w: float, m: float, a: float
+    x: np.ndarray,
+    t: int,
+    w: float,
+    m: float,
+    a: float,
+    out: np.ndarray | None = None,
+    fl: "FastLogicle | None" = None,
 ) -> np.ndarray:
-    fl = FastLogicle(T=t, W=w, M=m, A=a)
-    logicle_min, logicle_max = fl.inverse(0.0), fl.inverse(1.0 - sys.float_info.epsilon)
-    x = np.clip(x, logicle_min, logicle_max)
-    return np.vectorize(fl.scale)(x)
+    fl = fast_logicle(t, w, m, a) if fl is None else fl
+    return _native_scale(fl, x, out)
 
 
 def fastlogicle_inverse_wrapper(
-    x: np.ndarray, t: int, w: float, m: float, a: float
+    x: np.ndarray,
+    t: int,
+    w: float,
+    m: float,
+    a: float,
+    out: np.ndarray | None = None,
+    fl: "FastLogicle | None" = None,
 ) -> np.ndarray:
-    fl = FastLogicle(T=t, W=w, M=m, A=a)
-    return np.vectorize(fl.inverse)(x)
+    fl = fast_logicle(t, w, m, a) if fl is None else fl
+    return _native_inverse(fl, x, out)
+
+
+@dataclass(frozen=True)
+class LogiclePlan(CompiledTransform):
+    """
+    Compiled logicle transform. For the native backend it holds the FastLogicle object (which pickles
+    with its lookup table, so workers receive the table prebuilt) and runs each call on n_threads
+    threads inside the extension (with the GIL released); for the numpy backend, the blockwise kernels
+    with the lookup table in float32 and float64; for the numba backend, the coefficients of the
+    biexponential, which it solves for each element exactly. bounds is the range of data covered by
+    the lookup table, beyond which values are handled according to out_of_range.
+    """
+
+    _transient = ("kernels", "jit_arguments")
+
+    w: float
+    t: float
+    m: float
+    a: float
+    backend: str = "native"
+    n_threads: int = field(default=1, compare=False)
+    out_of_range: str = "clip"
+    fl: object = field(default=None, init=False, repr=False, compare=False)
+    bounds: tuple = field(default=None, init=False, repr=False, compare=False)
+    kernels: dict = field(default=None, init=False, repr=False, compare=False)
+    jit_arguments: tuple = field(default=None, init=False, repr=False, compare=False)
+    parallel: bool = field(default=False, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.out_of_range not in OUT_OF_RANGE:
+            raise ValueError(f"out_of_range must be one of {OUT_OF_RANGE}")
+        if self.backend == "native":
+            if self.fl is None:
+                fl = fast_logicle(self.t, self.w, self.m, self.a)
+                lookup = fl.lookup
+                self._set(fl=fl, bounds=(lookup[0], lookup[-1]))
+            # threaded in the extension, so run as a single call rather than in executor batches
+            self._set(parallel=self.n_threads != 1)
+            return
+        coef = logicle_coefficients(self.t, self.w, self.m, self.a)
+        self._set(bounds=(coef.lookup[0], coef.lookup[-1]))
+        if self.backend == "numba":
+            policy = OUT_OF_RANGE.index(self.out_of_range)
+            self._set(jit_arguments=(*coef[:8], *self.bounds, policy), parallel=True)
+            return
+        kernels = {}
+        for dtype in FLOAT_DTYPES:
+            lookup = lookup_table(self.t, self.w, self.m, self.a, dtype)
+            forward = partial(_logicle_block, lookup=lookup)
+            inverse = partial(_inverse_logicle_block, lookup=lookup)
+            if self.out_of_range != "clip":
+                nan = self.out_of_range == "nan"
+                forward = partial(
+                    _out_of_range_block,
+                    kernel=forward,
+                    lower=coef.lookup[0],
+                    upper=coef.lookup[-1],
+                    nan=nan,
+                    exact=partial(_logicle_exact, coef),
+                )
+                inverse = partial(
+                    _out_of_range_block,
+                    kernel=inverse,
+                    lower=0,
+                    upper=1,
+                    nan=nan,
+                    exact=partial(_biexponential, coef),
+                )
+            kernels[dtype] = forward, inverse
+        self._set(kernels=kernels)
+
+    def __call__(self, x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        if self.backend == "native":
+            return _native_scale(self.fl, x, out, self.n_threads, self.out_of_range)
+        if self.parallel:
+            return jit.apply("logicle", x, out, *self.jit_arguments)
+        x = np.asarray(x)
+        return blockwise(self.kernels[float_dtype(x, out)][0], x, out)
+
+    def inverse(self, x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        if self.backend == "native":
+            return _native_inverse(self.fl, x, out, self.n_threads, self.out_of_range)
+        if self.parallel:
+            arguments = self.jit_arguments
+            return jit.apply("inverse_logicle", x, out, *arguments[:8], arguments[-1])
+        x = np.asarray(x)
+        return blockwise(self.kernels[float_dtype(x, out)][1], x, out)
+
+    def counted(
+        self, x: np.ndarray, out: np.ndarray | None = None
+    ) -> tuple[np.ndarray, int]:
+        """
+        Forward transform, also returning the number of values outside the range of the lookup table
+        (clipped, made NaN or extrapolated according to out_of_range). The native backend counts them
+        as it transforms; the others take an extra pass over x.
+        """
+        if self.backend == "native":
+            return _native_scale(
+                self.fl, x, out, self.n_threads, self.out_of_range, count=True
+            )
+        x = np.asarray(x)
+        return self(x, out), int(np.count_nonzero(_outside(x, *self.bounds)))
 
 
 class LogicleTransform(Transform):
@@ -38,6 +530,10 @@ class LogicleTransform(Transform):
         t: int = 262144,
         a: float = 0.0,
         n_jobs: int = -1,
+        backend: str = "auto",
+        executor: str | Executor = "auto",
+        dtype: str | np.dtype | None = None,
+        out_of_range: str = "clip",
     ):
         """
         Parameters
@@ -70,13 +566,115 @@ class LogicleTransform(Transform):
             A smaller A value will push the linear range further from
             the negative values, making it easier to visualize and
             analyze data points further from zero.
+        backend: str
+            Either "native", which uses the compiled FastLogicle extension, or "numpy", which uses a
+            pure NumPy implementation of the same lookup table and needs no compiled extension. The
+            default, "auto", uses "native" when the extension is importable and "numpy" otherwise.
+            "numba" solves the biexponential exactly for each element in a compiled parallel loop,
+            falling back to "auto" if numba is not installed.
+        n_jobs: int
+            Number of parallel workers, -1 uses all available cores and 0 or 1 runs serially.
+        executor: str | Executor
+            How batches are run in parallel: "threads", "processes" or "serial", or an Executor
+            instance to share one worker pool between transformers. The default, "auto", picks
+            for each call whichever of these a calibrated cost model predicts to be fastest.
+        dtype: str | np.dtype, optional
+            Compute (and return) float32 or float64. By default float32 input stays float32 and
+            anything else is computed in float64.
+        out_of_range: str
+            How data beyond the range of the lookup table (and scale values outside [0, 1] when
+            inverse transforming) is handled: "clip" to the ends of the scale, "nan", or
+            "extrapolate" with the exact logicle function. NaN input always gives NaN.
         """
-        self._fl = FastLogicle(T=t, M=m, W=w, A=a)
+        if out_of_range not in OUT_OF_RANGE:
+            raise ValueError(f"out_of_range must be one of {OUT_OF_RANGE}")
+        self.out_of_range = out_of_range
+        if backend == "numba" and not jit.AVAILABLE:
+            backend = "auto"
+        if backend == "auto":
+            backend = "numpy" if FastLogicle is None else "native"
+        if backend == "native":
+            if FastLogicle is None:
+                raise ImportError(
+                    "logicle_ext is not available, use backend='numpy' instead"
+                )
+            functions = fastlogicle_wrapper, fastlogicle_inverse_wrapper
+        elif backend in ("numpy", "numba"):
+            functions = logicle, inverse_logicle
+        else:
+            raise ValueError(
+                "backend must be one of 'auto', 'native', 'numpy' or 'numba'"
+            )
+        self.backend = backend
         super().__init__(
-            transform_function=fastlogicle_wrapper,
-            inverse_transform_function=fastlogicle_inverse_wrapper,
+            transform_function=functions[0],
+            inverse_transform_function=functions[1],
             parameters={"w": w, "t": t, "m": m, "a": a},
             n_jobs=n_jobs,
+            executor=executor,
+            dtype=dtype,
+        )
+
+    @classmethod
+    def from_data(
+        cls,
+        data,
+        columns: list | None = None,
+        m: float = 4.5,
+        t: float | None = None,
+        a: float = 0.0,
+        q: float = 0.05,
+        chunk_rows: int = 1 << 18,
+        **kwargs,
+    ):
+        """
+        A logicle transform with parameters estimated from data by the rule of Parks, Roederer and
+        Moore: T is the largest value and W = (M - log10(T / |r|)) / 2, with r the q quantile of the
+        negative values (see cytotransform.estimate). The data is read once, chunk by chunk, into a
+        quantile sketch rather than sorted, so it does not need to fit in memory.
+
+        Parameters
+        ----------
+        data: np.ndarray | pd.DataFrame | FCSFile | str | os.PathLike | Iterable
+            One channel (1-D array) or several (2-D array, DataFrame, FCS file), a path to a .npy,
+            FCS or Parquet file, or an iterable of chunks (arrays or DataFrames) of the data.
+        columns: list, optional
+            Channels to estimate parameters for, by name or position, by default all of them.
+        m: float
+            Number of decades of the scale.
+        t: float, optional
+            Top of the scale, by default the largest value of each channel.
+        a: float
+            Additional decades of negative values.
+        q: float
+            Quantile of the negative values that the scale reaches down to.
+        chunk_rows: int
+            Number of rows read at a time.
+        kwargs:
+            Other arguments of the transformer (n_jobs, executor, dtype, backend, out_of_range).
+
+        Returns
+        -------
+        LogicleTransform | MultiChannelTransform
+            A transformer for 1-D data, otherwise a MultiChannelTransform with parameters per
+            channel.
+        """
+        from . import estimate
+
+        rule = partial(estimate.negative_rule_parameters, m=m, t=t, a=a, q=q)
+        return estimate.from_data(cls, data, rule, columns, chunk_rows, **kwargs)
+
+    def compile(self) -> LogiclePlan:
+        # the extension threads internally, unless batches are to be run in worker processes
+        threaded = self.backend == "native" and self.executor.kind in (
+            "auto",
+            "threads",
+        )
+        return LogiclePlan(
+            **self.parameters,
+            backend=self.backend,
+            n_threads=self.n_jobs if threaded else 1,
+            out_of_range=self.out_of_range,
         )
 
     def validation(self):
@@ -2,7 +2,15 @@
 #include <memory.h>
 #include <cmath>
 #include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
 #include <pybind11/stl.h>
+#include <algorithm>
+#include <atomic>
+#include <exception>
+#include <limits>
+#include <string>
+#include <thread>
+#include <vector>
 
 const int FastLogicle::DEFAULT_BINS = 1 << 12;
 
@@ -50,6 +58,14 @@ FastLogicle::FastLogicle (double T, double W)
 	initialize(DEFAULT_BINS);
 }
 
+FastLogicle::FastLogicle (double T, double W, double M, double A, int bins, const double * lookup)
+: Logicle(T, W, M, A, bins)
+{
+	p->bins = bins;
+	p->lookup = new double[bins + 1];
+	memcpy(p->lookup, lookup, (bins + 1) * sizeof (double));
+}
+
 FastLogicle::FastLogicle (const FastLogicle & logicle) : Logicle(logicle)
 {
 	p->bins = logicle.p->bins;
@@ -59,7 +75,7 @@ FastLogicle::FastLogicle (const FastLogicle & logicle) : Logicle(logicle)
 
 FastLogicle::~FastLogicle ()
 {
-	delete p->lookup;
+	delete[] p->lookup;
 }
 
 int FastLogicle::intScale (double value) const
@@ -125,6 +141,220 @@ double FastLogicle::inverse (int index) const
 
 namespace py = pybind11;
 
+// array entry points: loop over a contiguous buffer in C++ with the GIL released
+// so that a whole column crosses the Python boundary once rather than per event,
+// optionally split across n_threads threads (0 for all cores). They never throw for
+// bad values: out_of_range sets how values beyond the table are handled, and with
+// return_count the number of such values is returned alongside the result
+
+template <typename T>
+using contiguous_array = py::array_t<T, py::array::c_style | py::array::forcecast>;
+
+// allocate a result with the shape of values, or check and reuse a caller supplied out array,
+// which must be C-contiguous, writeable and of the result type (it may be values itself)
+template <typename R, typename T>
+static py::array_t<R> output_for (const contiguous_array<T> & values, const py::object & out)
+{
+	if (out.is_none())
+		return py::array_t<R>(std::vector<py::ssize_t>(values.shape(), values.shape() + values.ndim()));
+	if (!py::isinstance<py::array_t<R, py::array::c_style>>(out))
+		throw py::value_error("out must be a C-contiguous array of the result dtype");
+	auto result = py::reinterpret_borrow<py::array_t<R>>(out);
+	if (result.size() != values.size())
+		throw py::value_error("out must be the same size as the input");
+	if (!result.writeable())
+		throw py::value_error("out must be writeable");
+	return result;
+}
+
+// fewest elements given to each thread, so that small arrays are not slowed by starting threads
+static const py::ssize_t MIN_THREAD_CHUNK = 1 << 15;
+
+// number of threads to use for n elements when n_threads are requested, 0 meaning all cores
+static int thread_count (py::ssize_t n, int n_threads)
+{
+	if (n_threads <= 0)
+		n_threads = std::max(1u, std::thread::hardware_concurrency());
+	return (int) std::max<py::ssize_t>(1, std::min<py::ssize_t>(n_threads, n / MIN_THREAD_CHUNK));
+}
+
+// run body(begin, end) over [0, n) in contiguous chunks on up to n_threads threads, the calling
+// thread taking the last chunk; an exception thrown in any chunk is rethrown once all have finished
+template <typename F>
+static void parallel_for (py::ssize_t n, int n_threads, F body)
+{
+	int threads = thread_count(n, n_threads);
+	if (threads == 1)
+	{
+		body(0, n);
+		return;
+	}
+	std::vector<std::exception_ptr> errors(threads);
+	auto run = [&](int k) {
+		try
+		{
+			body(n * k / threads, n * (k + 1) / threads);
+		}
+		catch (...)
+		{
+			errors[k] = std::current_exception();
+		}
+	};
+	std::vector<std::thread> workers;
+	workers.reserve(threads - 1);
+	for (int k = 0; k < threads - 1; ++k)
+		workers.emplace_back(run, k);
+	run(threads - 1);
+	for (std::thread & worker : workers)
+		worker.join();
+	for (std::exception_ptr & error : errors)
+		if (error)
+			std::rethrow_exception(error);
+}
+
+// what the array methods do with values outside the range of the lookup table: clip them to the
+// ends of the scale, return NaN, or extrapolate with the exact (iterative) Logicle transform
+enum class OutOfRange { clip, nan, extrapolate };
+
+static OutOfRange out_of_range_policy (const std::string & policy)
+{
+	if (policy == "clip")
+		return OutOfRange::clip;
+	if (policy == "nan")
+		return OutOfRange::nan;
+	if (policy == "extrapolate")
+		return OutOfRange::extrapolate;
+	throw py::value_error("out_of_range must be one of 'clip', 'nan' or 'extrapolate'");
+}
+
+static const double NOT_A_NUMBER = std::numeric_limits<double>::quiet_NaN();
+
+// FastLogicle::scale without exceptions: NaN passes through and out of range values follow policy,
+// setting outside
+static double scale_value (const FastLogicle & self, double value, OutOfRange policy, bool & outside)
+{
+	const double * lookup = self.lookup();
+	int bins = self.bins();
+	if (!(value >= lookup[0] && value <= lookup[bins]))
+	{
+		if (std::isnan(value))
+			return value;
+		outside = true;
+		if (policy == OutOfRange::clip)
+			return value < lookup[0] ? 0 : 1;
+		if (policy == OutOfRange::nan || std::isinf(value))
+			return policy == OutOfRange::nan ? NOT_A_NUMBER : value;
+		try
+		{
+			return self.Logicle::scale(value);
+		}
+		catch (const Logicle::Exception &)
+		{
+			return NOT_A_NUMBER;
+		}
+	}
+	int index = (int) (std::upper_bound(lookup, lookup + bins + 1, value) - lookup) - 1;
+	index = std::min(index, bins - 1);
+	double delta = (value - lookup[index]) / (lookup[index + 1] - lookup[index]);
+	return (index + delta) / bins;
+}
+
+// FastLogicle::inverse without exceptions, for scale values in [0, 1] (both ends included)
+static double inverse_value (const FastLogicle & self, double scale, OutOfRange policy, bool & outside)
+{
+	const double * lookup = self.lookup();
+	int bins = self.bins();
+	if (!(scale >= 0 && scale <= 1))
+	{
+		if (std::isnan(scale))
+			return scale;
+		outside = true;
+		if (policy == OutOfRange::clip)
+			return scale < 0 ? lookup[0] : lookup[bins];
+		if (policy == OutOfRange::nan)
+			return NOT_A_NUMBER;
+		return self.Logicle::inverse(scale);
+	}
+	double x = scale * bins;
+	int index = std::min((int) x, bins - 1);
+	double delta = x - index;
+	return (1 - delta) * lookup[index] + delta * lookup[index + 1];
+}
+
+// FastLogicle::intScale without exceptions: out of range values are clipped to the first or last
+// bin, or given bin -1 unless policy is clip
+static int int_scale_value (const FastLogicle & self, double value, OutOfRange policy, bool & outside)
+{
+	const double * lookup = self.lookup();
+	int bins = self.bins();
+	if (!(value >= lookup[0] && value <= lookup[bins]))
+	{
+		outside = !std::isnan(value);
+		if (policy != OutOfRange::clip || !outside)
+			return -1;
+		return value < lookup[0] ? 0 : bins - 1;
+	}
+	int index = (int) (std::upper_bound(lookup, lookup + bins + 1, value) - lookup) - 1;
+	return std::min(index, bins - 1);
+}
+
+template <typename R, typename T, typename F>
+static py::object map_array (contiguous_array<T> values, const py::object & out, int n_threads,
+                             bool return_count, F func)
+{
+	py::array_t<R> result = output_for<R>(values, out);
+	const T * in = values.data();
+	R * dest = result.mutable_data();
+	py::ssize_t n = values.size();
+	std::atomic<py::ssize_t> count(0);
+	{
+		py::gil_scoped_release release;
+		parallel_for(n, n_threads, [&](py::ssize_t begin, py::ssize_t end) {
+			py::ssize_t outside = 0;
+			for (py::ssize_t i = begin; i < end; ++i)
+			{
+				bool flag = false;
+				dest[i] = (R) func((double) in[i], flag);
+				outside += flag;
+			}
+			count += outside;
+		});
+	}
+	if (return_count)
+		return py::make_tuple(result, count.load());
+	return std::move(result);
+}
+
+template <typename T>
+static py::object scale_array (const FastLogicle & self, contiguous_array<T> values, py::object out,
+                               int n_threads, const std::string & out_of_range, bool return_count)
+{
+	OutOfRange policy = out_of_range_policy(out_of_range);
+	return map_array<T>(values, out, n_threads, return_count, [&self, policy](double value, bool & outside) {
+		return scale_value(self, value, policy, outside);
+	});
+}
+
+template <typename T>
+static py::object inverse_array (const FastLogicle & self, contiguous_array<T> scales, py::object out,
+                                 int n_threads, const std::string & out_of_range, bool return_count)
+{
+	OutOfRange policy = out_of_range_policy(out_of_range);
+	return map_array<T>(scales, out, n_threads, return_count, [&self, policy](double scale, bool & outside) {
+		return inverse_value(self, scale, policy, outside);
+	});
+}
+
+template <typename T>
+static py::object int_scale_array (const FastLogicle & self, contiguous_array<T> values, py::object out,
+                                   int n_threads, const std::string & out_of_range, bool return_count)
+{
+	OutOfRange policy = out_of_range_policy(out_of_range);
+	return map_array<int>(values, out, n_threads, return_count, [&self, policy](double value, bool & outside) {
+		return int_scale_value(self, value, policy, outside);
+	});
+}
+
 PYBIND11_MODULE(logicle_ext, m) {
     m.doc() = "Python bindings for FastLogicle C++ implementation";
 
@@ -148,5 +378,48 @@ PYBIND11_MODULE(logicle_ext, m) {
         .def("inverse", (double (FastLogicle::*)(double) const) &FastLogicle::inverse, "A function to get inverse of double values",
              py::arg("scale"))
         .def("inverse", (double (FastLogicle::*)(int) const) &FastLogicle::inverse, "A function to get inverse of integer values",
-             py::arg("index"));
+             py::arg("index"))
+        .def_property_readonly("T", &FastLogicle::T)
+        .def_property_readonly("W", &FastLogicle::W)
+        .def_property_readonly("M", &FastLogicle::M)
+        .def_property_readonly("A", &FastLogicle::A, "A, as adjusted to put data zero on a bin boundary")
+        .def_property_readonly("bins", &FastLogicle::bins)
+        .def_property_readonly("lookup", [](const FastLogicle & self) {
+            return py::array_t<double>(self.bins() + 1, self.lookup());
+        }, "Copy of the lookup table, the inverse at bins + 1 evenly spaced scale values")
+        .def(py::pickle(
+            // pickle the lookup table so that unpickling (e.g. in a worker process) does not rebuild it
+            [](const FastLogicle & self) {
+                return py::make_tuple(self.T(), self.W(), self.M(), self.A(), self.bins(),
+                                      py::array_t<double>(self.bins() + 1, self.lookup()));
+            },
+            [](py::tuple state) {
+                if (state.size() != 6)
+                    throw std::runtime_error("invalid FastLogicle state");
+                int bins = state[4].cast<int>();
+                auto lookup = state[5].cast<contiguous_array<double>>();
+                if (lookup.size() != bins + 1)
+                    throw std::runtime_error("invalid FastLogicle lookup table");
+                return new FastLogicle(state[0].cast<double>(), state[1].cast<double>(),
+                                       state[2].cast<double>(), state[3].cast<double>(),
+                                       bins, lookup.data());
+            }))
+        .def("scale_array", &scale_array<double>, "Scale a contiguous float64 array of values",
+             py::arg("values"), py::arg("out") = py::none(), py::arg("n_threads") = 1,
+             py::arg("out_of_range") = "clip", py::arg("return_count") = false)
+        .def("scale_array", &scale_array<float>, "Scale a contiguous float32 array of values",
+             py::arg("values"), py::arg("out") = py::none(), py::arg("n_threads") = 1,
+             py::arg("out_of_range") = "clip", py::arg("return_count") = false)
+        .def("inverse_array", &inverse_array<double>, "Inverse of a contiguous float64 array of scale values",
+             py::arg("scales"), py::arg("out") = py::none(), py::arg("n_threads") = 1,
+             py::arg("out_of_range") = "clip", py::arg("return_count") = false)
+        .def("inverse_array", &inverse_array<float>, "Inverse of a contiguous float32 array of scale values",
+             py::arg("scales"), py::arg("out") = py::none(), py::arg("n_threads") = 1,
+             py::arg("out_of_range") = "clip", py::arg("return_count") = false)
+        .def("int_scale_array", &int_scale_array<double>, "Bin indices of a contiguous float64 array of values",
+             py::arg("values"), py::arg("out") = py::none(), py::arg("n_threads") = 1,
+             py::arg("out_of_range") = "clip", py::arg("return_count") = false)
+        .def("int_scale_array", &int_scale_array<float>, "Bin indices of a contiguous float32 array of values",
+             py::arg("values"), py::arg("out") = py::none(), py::arg("n_threads") = 1,
+             py::arg("out_of_range") = "clip", py::arg("return_count") = false);
 }
@@ -169,6 +169,9 @@ public:
         FastLogicle (double T, double W, double M);
         FastLogicle (double T, double W);
 
+        // rebuild from a previously computed lookup table of bins + 1 values
+        FastLogicle (double T, double W, double M, double A, int bins, const double * lookup);
+
         FastLogicle (const FastLogicle & logicle);
 
         virtual ~FastLogicle ();
@@ -177,6 +180,7 @@ public:
         virtual double inverse (double scale) const;
 
         inline int bins () const { return p->bins; };
+        inline const double * lookup () const { return p->lookup; };
 
         int intScale (double value) const;
         double inverse (int scale) const;
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+from dataclasses import replace
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Hashable
+
+import numpy as np
+
+from .base import (
+    BinnedTransform,
+    CompiledTransform,
+    FunctionPlan,
+    Transform,
+    _run_tasks,
+    is_dataframe,
+)
+from .executor import Executor
+from .io import FCSFile
+
+if TYPE_CHECKING:  # pragma: no cover
+    import pandas as pd
+
+
+class MultiChannelTransform(Transform):
+    """
+    Apply one kind of transform to many channels at once, each channel with its own parameters (e.g. a
+    logicle W and T or an asinh cofactor per fluorochrome).
+
+    One transformer is built (and validated) per distinct parameter set, so channels sharing parameters
+    share lookup tables. Transforms whose functions accept per-channel parameter arrays (asinh and log)
+    run as a single broadcast pass over the 2-D data; the others run per channel, with every
+    (channel, batch) pair submitted to one shared executor.
+    """
+
+    # parameters differ by column
+    elementwise = False
+
+    def __init__(
+        self,
+        transform: type[Transform],
+        parameters: dict[Hashable, dict],
+        n_jobs: int = -1,
+        executor: str | Executor = "auto",
+        dtype: str | np.dtype | None = None,
+    ):
+        """
+        Parameters
+        ----------
+        transform: type[Transform]
+            Transform class to apply, e.g. LogicleTransform.
+        parameters: dict
+            Mapping of channel (DataFrame column or FCS channel) to the keyword arguments of the
+            transform class for that channel. Array input must have one column per channel, in this
+            order.
+        n_jobs: int
+            Number of parallel workers, -1 uses all available cores and 0 or 1 runs serially.
+        executor: str | Executor
+            How batches are run in parallel: "threads", "processes" or "serial", or an Executor
+            instance to share one worker pool between transformers. The default, "auto", picks
+            for each call whichever of these a calibrated cost model predicts to be fastest.
+        dtype: str | np.dtype, optional
+            Compute (and return) float32 or float64. By default float32 input stays float32 and
+            anything else is computed in float64.
+        """
+        self.channels = list(parameters)
+        self._transformers: dict[tuple, Transform] = {}
+        self._channel_keys: list[tuple] = []
+        for params in parameters.values():
+            key = tuple(sorted(params.items()))
+            if key not in self._transformers:
+                self._transformers[key] = transform(**params, n_jobs=1, dtype=dtype)
+            self._channel_keys.append(key)
+        self._broadcast = transform.broadcast_parameters
+        self._broadcast_plan: CompiledTransform | None = None
+        plans = [t.compiled for t in self._channel_transformers()]
+        if self._broadcast and plans:
+            # a single plan whose parameters are tuples of the per-channel values
+            self._broadcast_plan = replace(
+                plans[0],
+                **{
+                    name: tuple(plan.parameters()[name] for plan in plans)
+                    for name in plans[0].parameters()
+                },
+            )
+        super().__init__(
+            transform_function=partial(self._apply_channels, inverse=False),
+            inverse_transform_function=partial(self._apply_channels, inverse=True),
+            parameters=parameters,
+            n_jobs=n_jobs,
+            executor=executor,
+            dtype=dtype,
+        )
+
+    def validation(self):
+        if not self.channels:
+            raise ValueError("at least one channel is required")
+
+    def _channel_transformers(self) -> list[Transform]:
+        return [self._transformers[key] for key in self._channel_keys]
+
+    def compile(self) -> FunctionPlan:
+        # channels are run through the plans of the per-channel transformers
+        return FunctionPlan(
+            self._transform_function, self._inverse_transform_function, ()
+        )
+
+    def _call(
+        self,
+        data: np.ndarray | pd.DataFrame,
+        func,
+        out: np.ndarray | None = None,
+        inplace: bool = False,
+        columns: list | None = None,
+    ) -> np.ndarray | pd.DataFrame:
+        columns = self._resolve_columns(data, columns)
+        return super()._call(data, func, out=out, inplace=inplace, columns=columns)
+
+    def _resolve_columns(
+        self, data: np.ndarray | pd.DataFrame, columns: list | None
+    ) -> list | None:
+        if columns is not None:
+            raise TypeError(
+                "columns are given by the channels of a MultiChannelTransform"
+            )
+        if is_dataframe(data) or isinstance(data, FCSFile):
+            return self.channels
+        return None
+
+    def _check_shape(self, data: np.ndarray):
+        if data.ndim != 2 or data.shape[1] != len(self.channels):
+            raise ValueError(
+                f"expected a 2-D array with {len(self.channels)} columns, one per channel"
+            )
+
+    def _multiprocess_call_array(
+        self, data: np.ndarray, func, out: np.ndarray | None = None
+    ) -> np.ndarray:
+        data = np.asarray(data)
+        self._check_shape(data)
+        out = self._output_for(data, out, func)
+        if isinstance(func, BinnedTransform):
+            self._apply_channels(data, out, inverse=False, n_bins=func.n_bins)
+        else:
+            func(data, out)
+        return out
+
+    def _apply_channels(
+        self,
+        data: np.ndarray,
+        out: np.ndarray,
+        inverse: bool,
+        n_bins: int | None = None,
+    ):
+        funcs = self._channel_funcs(inverse, n_bins)
+        # the cost per element is that of one channel's plan, whichever way channels are run; the
+        # broadcast plan holds parameters for every channel, so it cannot be costed on one
+        plan = self._channel_transformers()[0].compiled
+        cost_func = plan.inverse if inverse else plan
+        if n_bins is not None:
+            cost_func = BinnedTransform(cost_func, n_bins, self.dtype)
+        executor, batches = self._plan(data, cost_func, out.dtype, inverse)
+        if self._broadcast:
+            # one pass over all channels, with parameters broadcast along the channel axis
+            tasks = [(funcs[0], (batch, slice(None))) for batch in batches]
+        else:
+            tasks = [
+                (func, (batch, j)) for j, func in enumerate(funcs) for batch in batches
+            ]
+        _run_tasks(executor, tasks, data, out)
+
+    def _channel_funcs(
+        self, inverse: bool, n_bins: int | None = None
+    ) -> list[Callable]:
+        """
+        The function run over each channel (a single one for all channels when parameters broadcast).
+        """
+        plans = [t.compiled for t in self._channel_transformers()]
+        if self._broadcast:
+            plans = [self._broadcast_plan]
+        funcs = [plan.inverse if inverse else plan for plan in plans]
+        if n_bins is not None:
+            funcs = [BinnedTransform(func, n_bins, self.dtype) for func in funcs]
+        return funcs
+
+    def _units(
+        self, data: np.ndarray, func, unit_values: int
+    ) -> list[tuple[Callable, slice | tuple]]:
+        self._check_shape(data)
+        if isinstance(func, BinnedTransform):
+            funcs = self._channel_funcs(inverse=False, n_bins=func.n_bins)
+        else:
+            funcs = self._channel_funcs(inverse=func is not self.compiled)
+        if self._broadcast:
+            batches = self._row_chunks(data, unit_values // len(self.channels))
+            return [(funcs[0], (batch, slice(None))) for batch in batches]
+        batches = self._row_chunks(data, unit_values)
+        return [(func, (batch, j)) for j, func in enumerate(funcs) for batch in batches]
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field, replace
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Hashable, Sequence
+
+import numpy as np
+
+from .base import (
+    _SERIAL,
+    BLOCK_SIZE,
+    BinnedTransform,
+    CompiledTransform,
+    Transform,
+    _run_tasks,
+    float_dtype,
+    is_dataframe,
+)
+from .executor import Executor
+from .io import FCSFile
+
+if TYPE_CHECKING:  # pragma: no cover
+    import pandas as pd
+
+
+def _single_threaded(plan: CompiledTransform) -> CompiledTransform:
+    # plans that thread internally are run on one thread per block, blocks being run in parallel
+    if getattr(plan, "n_threads", 1) != 1:
+        return replace(plan, n_threads=1)
+    return plan
+
+
+def _as_tuple(values: np.ndarray) -> tuple:
+    # nested tuples of floats, so that plans holding matrices stay hashable
+    return (
+        tuple(map(_as_tuple, values)) if values.ndim > 1 else tuple(map(float, values))
+    )
+
+
+@dataclass(frozen=True)
+class PipelinePlan(CompiledTransform):
+    """
+    Compiled pipeline: compensation by the inverse of a spillover matrix, one compiled transform per
+    channel (None to leave a channel untransformed) and an affine rescaling y * scale + offset per
+    channel. Data is processed in blocks of block_rows rows, each block being compensated into a small
+    channel-major scratch array, transformed and rescaled there in place and written to the output
+    once, so every step works on data in cache and no full size intermediate is allocated.
+    """
+
+    _transient = ("spillover_", "compensation_", "scale_", "offset_")
+
+    plans: tuple
+    spillover: tuple | None
+    scale: tuple
+    offset: tuple
+    block_rows: int
+    spillover_: np.ndarray = field(init=False, repr=False, compare=False)
+    compensation_: np.ndarray = field(init=False, repr=False, compare=False)
+    scale_: np.ndarray = field(init=False, repr=False, compare=False)
+    offset_: np.ndarray = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        spillover = None if self.spillover is None else np.array(self.spillover)
+        self._set(
+            spillover_=spillover,
+            compensation_=None if spillover is None else np.linalg.inv(spillover),
+            scale_=np.array(self.scale)[:, np.newaxis],
+            offset_=np.array(self.offset)[:, np.newaxis],
+        )
+
+    def __call__(self, x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        return self._run(x, out, inverse=False)
+
+    def inverse(self, x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        return self._run(x, out, inverse=True)
+
+    def _run(self, x: np.ndarray, out: np.ndarray | None, inverse: bool) -> np.ndarray:
+        x = np.asarray(x)
+        if out is None:
+            out = np.empty(x.shape, dtype=float_dtype(x))
+        # one scratch array, channel-major so that each channel is contiguous, reused for every block
+        scratch = np.empty((x.shape[1], min(self.block_rows, len(x))), dtype=out.dtype)
+        for start in range(0, len(x), self.block_rows):
+            rows = slice(start, start + self.block_rows)
+            block = scratch[:, : len(x[rows])]
+            if inverse:
+                self._inverse_block(x[rows], block, out[rows])
+            else:
+                self._forward_block(x[rows], block, out[rows])
+        return out
+
+    def _forward_block(self, x: np.ndarray, block: np.ndarray, out: np.ndarray):
+        if self.compensation_ is None:
+            block[...] = x.T
+        else:
+            np.matmul(self.compensation_.T, x.T, out=block)
+        for plan, channel in zip(self.plans, block):
+            if plan is not None:
+                plan(channel, out=channel)
+        block *= self.scale_
+        block += self.offset_
+        out[...] = block.T
+
+    def _inverse_block(self, x: np.ndarray, block: np.ndarray, out: np.ndarray):
+        block[...] = x.T
+        block -= self.offset_
+        block /= self.scale_
+        for plan, channel in zip(self.plans, block):
+            if plan is not None:
+                plan.inverse(channel, out=channel)
+        if self.spillover_ is None:
+            out[...] = block.T
+        else:
+            out[...] = block.T @ self.spillover_
+
+
+class TransformPipeline(Transform):
+    """
+    Spillover compensation, per-channel transforms and affine rescaling (e.g. to a display range) fused
+    into one pass over the data, with an inverse that runs the steps in reverse. Rather than three
+    full-array passes, each allocating its result, the steps run one after another on cache sized
+    blocks of rows, and row batches of the whole pipeline share one executor.
+    """
+
+    # parameters differ by column
+    elementwise = False
+
+    def __init__(
+        self,
+        transforms: Transform
+        | Sequence[Transform | None]
+        | dict[Hashable, Transform | None],
+        spillover: np.ndarray | None = None,
+        scale: float | Sequence[float] = 1.0,
+        offset: float | Sequence[float] = 0.0,
+        channels: list | None = None,
+        n_jobs: int = -1,
+        executor: str | Executor = "auto",
+        dtype: str | np.dtype | None = None,
+    ):
+        """
+        Parameters
+        ----------
+        transforms: Transform | Sequence[Transform | None] | dict
+            Transformer for each channel in order, or a mapping of channel (DataFrame column) to
+            transformer. None leaves a channel untransformed; a single transformer is applied to every
+            channel (which then must be given by channels or spillover).
+        spillover: np.ndarray, optional
+            Spillover matrix, with a row per fluorochrome giving its spill into each channel. Data is
+            compensated by multiplying by its inverse before being transformed.
+        scale: float | Sequence[float]
+            Factor applied to the transformed values, per channel or for all channels.
+        offset: float | Sequence[float]
+            Offset added to the scaled values, per channel or for all channels.
+        channels: list, optional
+            DataFrame columns the channels are read from, if transforms is not a mapping. By default
+            DataFrames are transformed in all of their columns.
+        n_jobs: int
+            Number of parallel workers, -1 uses all available cores and 0 or 1 runs serially.
+        executor: str | Executor
+            How batches are run in parallel: "threads", "processes" or "serial", or an Executor
+            instance to share one worker pool between transformers. The default, "auto", picks
+            for each call whichever of these a calibrated cost model predicts to be fastest.
+        dtype: str | np.dtype, optional
+            Compute (and return) float32 or float64. By default float32 input stays float32 and
+            anything else is computed in float64.
+        """
+        if isinstance(transforms, dict):
+            channels = list(transforms)
+            transforms = list(transforms.values())
+        elif isinstance(transforms, Transform):
+            if channels is None and spillover is None:
+                raise ValueError(
+                    "a single transform needs channels or spillover to give the number of channels"
+                )
+            n_channels = (
+                len(channels) if channels is not None else np.shape(spillover)[0]
+            )
+            transforms = [transforms] * n_channels
+        self.channels = None if channels is None else list(channels)
+        self.transforms: list[Transform | None] = list(transforms)
+        n_channels = len(self.transforms)
+        super().__init__(
+            transform_function=partial(self._apply_pipeline, inverse=False),
+            inverse_transform_function=partial(self._apply_pipeline, inverse=True),
+            parameters={
+                "spillover": None
+                if spillover is None
+                else np.asarray(spillover, dtype=np.float64),
+                "scale": np.broadcast_to(
+                    np.asarray(scale, dtype=np.float64), n_channels
+                ),
+                "offset": np.broadcast_to(
+                    np.asarray(offset, dtype=np.float64), n_channels
+                ),
+            },
+            n_jobs=n_jobs,
+            executor=executor,
+            dtype=dtype,
+        )
+
+    def validation(self):
+        n_channels = len(self.transforms)
+        if not n_channels:
+            raise ValueError("at least one channel is required")
+        if self.channels is not None and len(self.channels) != n_channels:
+            raise ValueError("channels must have one entry per transform")
+        spillover = self.parameters["spillover"]
+        if spillover is not None:
+            if spillover.shape != (n_channels, n_channels):
+                raise ValueError(
+                    f"spillover must be a {n_channels} x {n_channels} matrix, one row per channel"
+                )
+            if np.linalg.cond(spillover) > 1 / np.finfo(np.float64).eps:
+                raise ValueError("spillover must be invertible")
+        if not np.all(self.parameters["scale"] != 0):
+            raise ValueError("scale must be non-zero")
+
+    def compile(self) -> PipelinePlan:
+        spillover = self.parameters["spillover"]
+        n_channels = len(self.transforms)
+        return PipelinePlan(
+            plans=tuple(
+                None if t is None else _single_threaded(t.compiled)
+                for t in self.transforms
+            ),
+            spillover=None if spillover is None else _as_tuple(spillover),
+            scale=_as_tuple(self.parameters["scale"]),
+            offset=_as_tuple(self.parameters["offset"]),
+            block_rows=max(1, BLOCK_SIZE // n_channels),
+        )
+
+    def _apply_pipeline(
+        self, x: np.ndarray, out: np.ndarray | None = None, inverse: bool = False
+    ) -> np.ndarray:
+        # the steps are run by the compiled plan
+        if inverse:
+            return self.compiled.inverse(x, out=out)
+        return self.compiled(x, out=out)
+
+    def _call(
+        self,
+        data: np.ndarray | pd.DataFrame,
+        func,
+        out: np.ndarray | None = None,
+        inplace: bool = False,
+        columns: list | None = None,
+    ) -> np.ndarray | pd.DataFrame:
+        columns = self._resolve_columns(data, columns)
+        return super()._call(data, func, out=out, inplace=inplace, columns=columns)
+
+    def _resolve_columns(
+        self, data: np.ndarray | pd.DataFrame, columns: list | None
+    ) -> list | None:
+        if columns is not None:
+            raise TypeError("columns are given by the channels of a TransformPipeline")
+        if is_dataframe(data) or isinstance(data, FCSFile):
+            return self.channels
+        return None
+
+    def _check_shape(self, data: np.ndarray):
+        if data.ndim != 2 or data.shape[1] != len(self.transforms):
+            raise ValueError(
+                f"expected a 2-D array with {len(self.transforms)} columns, one per channel"
+            )
+
+    def _units(
+        self, data: np.ndarray, func, unit_values: int
+    ) -> list[tuple[Callable, slice]]:
+        # compensation mixes channels, so units are always blocks of whole rows
+        self._check_shape(data)
+        batches = self._row_chunks(data, unit_values // len(self.transforms))
+        return [(func, batch) for batch in batches]
+
+    def _multiprocess_call_array(
+        self, data: np.ndarray, func, out: np.ndarray | None = None
+    ) -> np.ndarray:
+        data = np.asarray(data)
+        self._check_shape(data)
+        out = self._output_for(data, out, func)
+        executor, batches = self._plan(data, func, out.dtype, self._is_inverse(func))
+        _run_tasks(executor, [(func, batch) for batch in batches], data, out)
+        return out
+
+    def _choose_plan(
+        self, data: np.ndarray, func, dtype: np.dtype, inverse: bool
+    ) -> tuple:
+        # each value goes through one channel's transform, which dominates the cost of the pipeline:
+        # batches of rows are planned from the mean cost of the channels' plans, which run on a single
+        # thread within the pipeline however they run on their own
+        plans = [plan for plan in self.compiled.plans if plan is not None]
+        if not plans:
+            return _SERIAL, [slice(None)]
+        if isinstance(func, BinnedTransform):
+            # binning costs little next to the transforms, so batches are planned as for values
+            dtype = self.dtype or float_dtype(data)
+        funcs = [plan.inverse if inverse else plan for plan in plans]
+        return self._plan_batches(data, funcs, dtype, inverse)
@@ -0,0 +1,169 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Callable, Iterator
+
+# phases of a call, in the order they run: pulling the channels out of a DataFrame, choosing the
+# executor and batches, running the batches, copying process results into the output and putting
+# the result DataFrame together
+PHASES = ("extract", "plan", "compute", "gather", "assemble")
+
+_current: ContextVar["CallStats | None"] = ContextVar("call_stats", default=None)
+
+
+def current() -> "CallStats | None":
+    """
+    Stats of the call being profiled in this thread, or None when it is not being profiled (so that
+    instrumented code only has to check for None).
+    """
+    return _current.get()
+
+
+@dataclass
+class CallStats:
+    """
+    Measurements of one transform or inverse_transform call. Times are wall clock seconds.
+
+    worker_time is the time spent inside the transform summed over batches, so that worker_utilization,
+    its share of the compute phase times the number of workers used, shows how much of the compute
+    phase went on dispatch, pickling and idle workers rather than on the math.
+    """
+
+    transformer: str
+    method: str
+    input: str
+    n_events: int
+    n_values: int
+    executor: str = "serial"
+    n_workers: int = 1
+    n_batches: int = 1
+    phases: dict[str, float] = field(default_factory=dict)
+    bytes_copied: int = 0
+    worker_time: float = 0.0
+    wall_time: float = 0.0
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    @property
+    def events_per_second(self) -> float:
+        return self.n_events / self.wall_time if self.wall_time > 0 else 0.0
+
+    @property
+    def worker_utilization(self) -> float:
+        capacity = self.phases.get("compute", 0.0) * min(self.n_workers, self.n_batches)
+        return min(1.0, self.worker_time / capacity) if capacity > 0 else 0.0
+
+    def add(self, phase: str, seconds: float, nbytes: int = 0):
+        """
+        Add time spent in a phase, and the bytes copied during it.
+        """
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+            self.bytes_copied += nbytes
+
+    def add_worker_time(self, seconds: float, nbytes: int = 0):
+        with self._lock:
+            self.worker_time += seconds
+            self.bytes_copied += nbytes
+
+    def planned(self, executor, n_batches: int, seconds: float):
+        """
+        Record the executor and number of batches chosen for the call.
+        """
+        self.executor = executor.kind
+        self.n_workers = executor.n_jobs
+        self.n_batches = n_batches
+        self.add("plan", seconds)
+
+    def as_dict(self) -> dict:
+        """
+        Flat dict of the stats, e.g. to export to a metrics system, with a phase_<name> entry for
+        the time spent in each phase.
+        """
+        return {
+            "transformer": self.transformer,
+            "method": self.method,
+            "input": self.input,
+            "n_events": self.n_events,
+            "n_values": self.n_values,
+            "executor": self.executor,
+            "n_workers": self.n_workers,
+            "n_batches": self.n_batches,
+            **{f"phase_{name}": self.phases.get(name, 0.0) for name in PHASES},
+            "bytes_copied": self.bytes_copied,
+            "worker_time": self.worker_time,
+            "worker_utilization": self.worker_utilization,
+            "wall_time": self.wall_time,
+            "events_per_second": self.events_per_second,
+        }
+
+
+class Profiler:
+    """
+    Collects CallStats for the calls of the transformers it is attached to (see Transform.profile, or
+    set transformer.profiler to attach it for good). Without a profiler, calls are not instrumented
+    beyond a few checks for one.
+    """
+
+    def __init__(
+        self, callback: Callable[[CallStats], None] | None = None, keep: bool = True
+    ):
+        """
+        Parameters
+        ----------
+        callback: Callable[[CallStats], None], optional
+            Called with the stats of each call as it completes, e.g. to export them.
+        keep: bool
+            Keep the stats of every call in calls. Set to False for a long lived profiler that
+            only feeds a callback.
+        """
+        self.callback = callback
+        self.keep = keep
+        self.calls: list[CallStats] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def call(self, stats: CallStats) -> Iterator[CallStats]:
+        """
+        Profile the call made within the context, recording stats once it has completed.
+        """
+        token = _current.set(stats)
+        start = perf_counter()
+        try:
+            yield stats
+        finally:
+            _current.reset(token)
+        stats.wall_time = perf_counter() - start
+        if self.keep:
+            with self._lock:
+                self.calls.append(stats)
+        if self.callback is not None:
+            self.callback(stats)
+
+    def summary(self) -> dict:
+        """
+        Totals over the recorded calls: number of calls, events, bytes copied and time in each phase,
+        and the overall event rate.
+        """
+        with self._lock:
+            calls = list(self.calls)
+        wall_time = sum(stats.wall_time for stats in calls)
+        n_events = sum(stats.n_events for stats in calls)
+        return {
+            "n_calls": len(calls),
+            "n_events": n_events,
+            **{
+                f"phase_{name}": sum(stats.phases.get(name, 0.0) for stats in calls)
+                for name in PHASES
+            },
+            "bytes_copied": sum(stats.bytes_copied for stats in calls),
+            "wall_time": wall_time,
+            "events_per_second": n_events / wall_time if wall_time > 0 else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            self.calls.clear()
@@ -0,0 +1,189 @@
+"""
+Scheduling of many samples at once (see Transform.transform_many). Each sample is split into small
+work units and every unit is submitted to the transformer's one executor, whose workers take units
+from a single shared queue: a worker that is done with its unit takes the next one, of whichever
+sample it belongs to, so workers stay busy however the samples' sizes differ. A bounded number of
+samples are held in memory, with the next ones read in a background thread, and each sample is
+yielded as soon as its last unit is done.
+"""
+from __future__ import annotations
+
+import os
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
+
+import numpy as np
+
+from . import stream
+from .base import BinnedTransform, _apply_task, float_dtype, is_dataframe
+from .io import FCSFile
+
+if TYPE_CHECKING:  # pragma: no cover
+    import pandas as pd
+
+    from .base import Transform
+
+# values transformed per work unit: enough to amortize dispatch, few enough to balance workers
+UNIT_VALUES = 1 << 16
+
+
+class Sample:
+    """
+    One sample being transformed: the block of values its units read from and write into, and how
+    to put its result together once they are all done.
+    """
+
+    def __init__(
+        self,
+        position: int,
+        values: np.ndarray,
+        out: np.ndarray,
+        units: list[tuple[Callable, slice | tuple]],
+        finish: Callable[[], np.ndarray | pd.DataFrame],
+    ):
+        self.position = position
+        self.values = values
+        self.out = out
+        self.units = units
+        self.finish = finish
+        self.remaining = len(units)
+
+
+def prepare(
+    transformer: Transform,
+    position: int,
+    source,
+    func: Callable,
+    columns: list | None,
+    unit_values: int = UNIT_VALUES,
+) -> Sample:
+    """
+    Read a sample (array, DataFrame, FCSFile, or path to a .npy or FCS file) and split it into
+    units. Values are transformed in place where the output has their dtype.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        source = stream.open_source(source)
+        if not isinstance(source, (np.ndarray, FCSFile)):
+            raise ValueError("only .npy and FCS files can be transformed by path")
+    columns = transformer._resolve_columns(source, columns)
+    binned = isinstance(func, BinnedTransform)
+    if is_dataframe(source):
+        columns = list(source.columns) if columns is None else list(columns)
+        values = transformer._frame_values(source, columns)
+        out = transformer._output_for(values, None, func) if binned else values
+
+        def finish():
+            return transformer._assemble_frame(source, columns, out, inplace=False)[0]
+
+    elif isinstance(source, FCSFile):
+        dtype = transformer.dtype or float_dtype(source.dtype)
+        data = source.read(dtype=dtype)
+        if columns is None:
+            values = data
+        else:
+            # channels are transformed as a column-major block, as for DataFrames
+            index = source.channel_index(columns)
+            values = np.asfortranarray(data[:, index])
+        out = transformer._output_for(values, None, func) if binned else values
+
+        def finish():
+            # bin indices are returned for the selected channels only, not mixed with float values
+            if columns is None or binned:
+                return out
+            data[:, index] = out
+            return data
+
+    else:
+        if columns is not None:
+            raise TypeError("columns is only supported for DataFrame and FCS input")
+        values = np.asarray(source)
+        out = transformer._output_for(values, None, func)
+
+        def finish():
+            return out
+
+    return Sample(
+        position, values, out, transformer._units(values, func, unit_values), finish
+    )
+
+
+def _run_unit(sample: Sample, func: Callable, index: slice | tuple):
+    func(sample.values[index], out=sample.out[index])
+
+
+def run(
+    transformer: Transform,
+    sources: Iterable,
+    func: Callable,
+    columns: list | None = None,
+    max_samples: int | None = None,
+) -> Iterator[tuple[int, np.ndarray | pd.DataFrame]]:
+    """
+    Run func over every sample of sources with the transformer's executor, yielding (position,
+    result) pairs as samples are finished.
+    """
+    executor = transformer.executor
+    if executor.kind == "auto":
+        # units are small and numpy releases the GIL, so threads avoid copying samples to processes
+        executor = executor.get("threads")
+    max_samples = max_samples or 2 * executor.n_jobs
+    if max_samples < 1:
+        raise ValueError("max_samples must be a positive integer")
+    samples = stream.read_ahead(
+        prepare(transformer, position, source, func, columns)
+        for position, source in enumerate(sources)
+    )
+    try:
+        if executor.pool is None:
+            for sample in samples:
+                for unit_func, index in sample.units:
+                    _run_unit(sample, unit_func, index)
+                yield sample.position, sample.finish()
+            return
+        yield from _schedule(executor, samples, max_samples)
+    finally:
+        samples.close()
+
+
+def _schedule(
+    executor, samples: Iterator[Sample], max_samples: int
+) -> Iterator[tuple[int, np.ndarray | pd.DataFrame]]:
+    pool = executor.pool
+    running: dict = {}
+    n_samples = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and n_samples < max_samples:
+                sample = next(samples, None)
+                if sample is None:
+                    exhausted = True
+                    break
+                if not sample.units:
+                    yield sample.position, sample.finish()
+                    continue
+                n_samples += 1
+                for func, index in sample.units:
+                    if executor.shares_memory:
+                        future = pool.submit(_run_unit, sample, func, index)
+                    else:
+                        task = (func, sample.values[index], sample.out.dtype)
+                        future = pool.submit(_apply_task, task)
+                    running[future] = sample, index
+            if not running:
+                return
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                sample, index = running.pop(future)
+                result = future.result()
+                if not executor.shares_memory:
+                    sample.out[index] = result
+                sample.remaining -= 1
+                if sample.remaining == 0:
+                    n_samples -= 1
+                    yield sample.position, sample.finish()
+    finally:
+        # on an error, or if the caller stops early, units not started are dropped
+        for future in running:
+            future.cancel()
+        wait(running)
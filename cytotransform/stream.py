@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+import numpy as np
+
+from .io import FCSFile
+
+if TYPE_CHECKING:  # pragma: no cover
+    import pandas as pd
+
+# number of chunks read ahead of the one being transformed
+READ_AHEAD = 2
+DEFAULT_CHUNK_ROWS = 1 << 20
+PARQUET_SUFFIXES = (".parquet", ".pq")
+FCS_SUFFIXES = (".fcs", ".lmd")
+
+_CHUNK, _ERROR, _DONE = range(3)
+
+
+def read_ahead(chunks: Iterable, size: int = READ_AHEAD) -> Iterator:
+    """
+    Iterate over chunks, producing up to size of them ahead of the consumer in a background thread so
+    that reading (disk I/O, memory map page faults, Parquet decoding) overlaps with transforming.
+
+    Parameters
+    ----------
+    chunks: Iterable
+        Chunks to iterate over; consumed from a background thread.
+    size: int
+        Maximum number of chunks held ahead of the consumer. 0 reads synchronously.
+
+    Returns
+    -------
+    Iterator
+        The chunks, in order.
+    """
+    if size < 1:
+        yield from chunks
+        return
+    buffer: queue.Queue = queue.Queue(maxsize=size)
+    stop = threading.Event()
+
+    def put(item):
+        # wait for space, giving up if the consumer has gone away
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if not put((_CHUNK, chunk)):
+                    return
+        except BaseException as e:
+            put((_ERROR, e))
+        else:
+            put((_DONE, None))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, item = buffer.get()
+            if kind == _DONE:
+                return
+            if kind == _ERROR:
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _is_parquet(path: str | os.PathLike) -> bool:
+    return Path(path).suffix.lower() in PARQUET_SUFFIXES
+
+
+def open_source(src: str | os.PathLike | np.ndarray):
+    """
+    Open src for chunked reading: arrays (including np.memmap) and FCSFiles are returned as is, .npy
+    and FCS files are memory mapped and Parquet files are opened as a pyarrow ParquetFile.
+    """
+    if isinstance(src, (np.ndarray, FCSFile)):
+        return src
+    if Path(src).suffix.lower() == ".npy":
+        return np.load(src, mmap_mode="r")
+    if Path(src).suffix.lower() in FCS_SUFFIXES:
+        return FCSFile(src)
+    if _is_parquet(src):
+        return _parquet().ParquetFile(src)
+    raise ValueError(
+        f"unsupported source {src}, expected an array, .npy, .fcs or .parquet"
+    )
+
+
+def open_array_destination(
+    dst: str | os.PathLike | np.ndarray, shape: tuple, dtype: np.dtype
+) -> np.ndarray:
+    """
+    Array to write transformed chunks of an array source into: dst itself if it is an array, or a new
+    memory mapped .npy file.
+    """
+    if isinstance(dst, np.ndarray):
+        if dst.shape != shape:
+            raise ValueError(f"dst has shape {dst.shape} but src has shape {shape}")
+        return dst
+    if Path(dst).suffix.lower() != ".npy":
+        raise ValueError(
+            f"array sources can only be written to arrays or .npy, not {dst}"
+        )
+    return np.lib.format.open_memmap(dst, mode="w+", dtype=dtype, shape=shape)
+
+
+def array_chunks(src: np.ndarray, chunk_rows: int) -> Iterator[tuple[int, np.ndarray]]:
+    """
+    Copies of consecutive row chunks of src, with their first row. Copying reads the chunk, so under
+    read_ahead the I/O for a memory mapped source happens in the background thread.
+    """
+    for start in range(0, len(src), chunk_rows):
+        yield start, np.array(src[start : start + chunk_rows])
+
+
+def parquet_chunks(src, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    Consecutive chunks of at most chunk_rows rows of a ParquetFile, as DataFrames.
+    """
+    for batch in src.iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+
+class ParquetChunkWriter:
+    """
+    Append DataFrame chunks to a Parquet file, one row group per chunk.
+    """
+
+    def __init__(self, dst: str | os.PathLike):
+        if isinstance(dst, np.ndarray) or not _is_parquet(dst):
+            raise ValueError(
+                f"Parquet sources can only be written to .parquet, not {dst}"
+            )
+        self.dst = dst
+        self._writer = None
+
+    def write(self, chunk: pd.DataFrame):
+        pa = _pyarrow()
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._writer is None:
+            self._writer = _parquet().ParquetWriter(self.dst, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:  # pragma: no cover
+        raise ImportError("reading and writing Parquet requires pyarrow") from e
+    return pyarrow
+
+
+def _parquet():
+    _pyarrow()
+    import pyarrow.parquet
+
+    return pyarrow.parquet
@@ -0,0 +1,13 @@
+import pytest
+
+from cytotransform import cost
+
+
+@pytest.fixture(autouse=True)
+def cost_model_cache(tmp_path, monkeypatch):
+    """
+    Calibrate the cost model afresh for each test, into a temporary directory rather than the user's
+    cache directory.
+    """
+    monkeypatch.setenv("CYTOTRANSFORM_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(cost, "_default_model", None)
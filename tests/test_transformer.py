@@ -1,13 +1,41 @@
+import asyncio
+import pickle
+import subprocess
+import sys
 from typing import NamedTuple, Type
 
 import numpy as np
 import pandas as pd
 import pytest
 
-from cytotransform.asinh import AsinhTransform
+from cytotransform import (
+    FCSFile,
+    MultiChannelTransform,
+    Profiler,
+    TabulatedTransform,
+    TransformPipeline,
+    aio,
+    cost,
+    histogram2d,
+    jit,
+)
+from cytotransform.asinh import AsinhPlan, AsinhTransform
 from cytotransform.base import Transform
+from cytotransform.cost import CostModel, Plan, function_key
+from cytotransform.estimate import QuantileSketch
+from cytotransform.hyperlog import (
+    MIN_W,
+    HyperlogTransform,
+    hyperlog,
+    inverse_hyperlog,
+)
 from cytotransform.log import ParametrizedLogTransform
-from cytotransform.logicle import LogicleTransform
+from cytotransform.logicle import (
+    LogicleTransform,
+    _logicle_exact,
+    fast_logicle,
+    logicle_coefficients,
+)
 
 
 class TestCase(NamedTuple):
@@ -224,3 +252,884 @@ def test_transforms_dataframe(n_jobs: int, group: TestGroup):
         inverse_transformed_df = transformer.inverse_transform(transformed_df)
         for col in inverse_transformed_df.columns:
             assert np.allclose(inverse_transformed_df[col], x, atol=1e-5)
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_fastlogicle_array_methods(dtype):
+    FastLogicle = pytest.importorskip("logicle_ext").FastLogicle
+    fl = FastLogicle(T=1000, W=1.0, M=4.0, A=0.0)
+    x = LogicleGroup.x.astype(dtype)
+    y = fl.scale_array(x)
+    assert y.dtype == dtype
+    assert np.allclose(y, [fl.scale(v) for v in x], atol=1e-6)
+    assert np.allclose(fl.inverse_array(y), [fl.inverse(v) for v in y], atol=1e-3)
+    assert np.array_equal(fl.int_scale_array(x), [fl.int_scale(v) for v in x])
+
+
+def test_fastlogicle_cache_and_pickle():
+    pytest.importorskip("logicle_ext")
+    fl = fast_logicle(1000, 1.0, 4.0, 1.0)
+    assert fast_logicle(1000, 1.0, 4.0, 1.0) is fl
+    restored = pickle.loads(pickle.dumps(fl))
+    assert (restored.T, restored.W, restored.M, restored.A, restored.bins) == (
+        fl.T,
+        fl.W,
+        fl.M,
+        fl.A,
+        fl.bins,
+    )
+    assert np.array_equal(restored.lookup, fl.lookup)
+    x = LogicleGroup.x.astype(np.float64)
+    assert np.array_equal(restored.scale_array(x), fl.scale_array(x))
+    # the transformer's compiled plan holds the cached object, and ships it to workers with its table
+    transformer = LogicleTransform(t=1000, w=1.0, m=4.0, a=1.0, backend="native")
+    assert transformer.compiled.fl is fl
+    assert np.array_equal(
+        pickle.loads(pickle.dumps(transformer.compiled)).fl.lookup, fl.lookup
+    )
+
+
+def test_fastlogicle_threads():
+    pytest.importorskip("logicle_ext")
+    fl = fast_logicle(262144, 0.5, 4.5, 0.0)
+    x = np.tile(LogicleGroup.x.astype(np.float64), 20000)
+    for dtype in (np.float32, np.float64):
+        values = x.astype(dtype)
+        y = fl.scale_array(values)
+        assert np.array_equal(fl.scale_array(values, n_threads=4), y)
+        out = np.empty_like(y)
+        fl.inverse_array(y, out=out, n_threads=0)
+        assert np.array_equal(out, fl.inverse_array(y))
+    # out of range values are counted across all threads
+    y[-1] = 2.0
+    result, count = fl.inverse_array(y, n_threads=4, return_count=True)
+    assert count == 1 and result[-1] == fl.lookup[-1]
+    # transformers run the extension threaded in one call, unless batches go to processes
+    transformer = LogicleTransform(n_jobs=4, executor="threads", backend="native")
+    assert transformer.compiled.n_threads == 4 and transformer.compiled.parallel
+    assert transformer.compiled == LogicleTransform(n_jobs=1).compiled
+    assert np.array_equal(transformer.transform(x), fl.scale_array(x))
+    processes = LogicleTransform(n_jobs=4, executor="processes", backend="native")
+    assert processes.compiled.n_threads == 1
+
+
+@pytest.mark.parametrize("n_jobs", [1, -1])
+def test_logicle_numpy_backend(n_jobs: int):
+    for case in LogicleGroup.cases:
+        transformer = LogicleTransform(**case.params, n_jobs=n_jobs, backend="numpy")
+        assert np.allclose(transformer.transform(LogicleGroup.x), case.y, atol=1e-5)
+        assert np.allclose(
+            transformer.inverse_transform(case.y), LogicleGroup.x, atol=1e-5
+        )
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"t_": 1000, "w_": 1.0, "m_": 4.0, "a_": 0.0},
+        {"t_": 1000, "w_": 1.0, "m_": 4.0, "a_": 1.0},
+        {"t_": 262144, "w_": 0.5, "m_": 4.5, "a_": -0.5},
+        {"t_": 262144, "w_": 2.0, "m_": 4.5, "a_": 0.5},
+    ],
+)
+def test_hyperlog_solver(params: dict):
+    y = np.linspace(-1.5, 1.5, 100001)
+    x = inverse_hyperlog(y, **params)
+    assert np.allclose(hyperlog(x, **params), y, rtol=0, atol=1e-9)
+    x = np.array([np.nan, np.inf, -np.inf, 0.0])
+    assert np.array_equal(hyperlog(x, **params)[:3], x[:3], equal_nan=True)
+
+
+def test_hyperlog_transform_round_trip():
+    transformer = HyperlogTransform(t=262144, w=0.5, m=4.5, a=0.0, n_jobs=1)
+    x = np.random.default_rng(42).normal(1000, 5000, 100000)
+    assert np.allclose(
+        transformer.inverse_transform(transformer.transform(x)), x, atol=1e-6
+    )
+
+
+@pytest.mark.parametrize("executor", ["serial", "threads", "processes"])
+@pytest.mark.parametrize("group", [AsinhGroup, LogGroup, LogicleGroup])
+def test_executors(executor: str, group: TestGroup):
+    case = group.cases[0]
+    x = np.concatenate([group.x for _ in range(10000)])
+    y = np.concatenate([case.y for _ in range(10000)])
+    with group.klass(**case.params, n_jobs=2, executor=executor) as transformer:
+        assert np.allclose(transformer.transform(x), y, atol=1e-5)
+        pool = transformer.executor.pool
+        assert np.allclose(transformer.inverse_transform(y), x, atol=1e-5)
+        assert transformer.executor.pool is pool
+        df = transformer.transform(pd.DataFrame({"x1": x, "x2": x}))
+        assert np.allclose(df["x2"], y, atol=1e-5)
+    assert transformer.executor._pool is None
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+@pytest.mark.parametrize("group", [AsinhGroup, LogGroup, LogicleGroup])
+def test_transform_out_and_inplace(n_jobs: int, group: TestGroup):
+    case = group.cases[0]
+    x = np.concatenate([group.x for _ in range(2000)])
+    y = np.concatenate([case.y for _ in range(2000)])
+    transformer = group.klass(**case.params, n_jobs=n_jobs)
+    out = np.empty_like(x)
+    assert transformer.transform(x, out=out) is out
+    assert np.allclose(out, y, atol=1e-5)
+    data = y.copy()
+    assert transformer.inverse_transform(data, inplace=True) is data
+    assert np.allclose(data, x, atol=1e-5)
+    with pytest.raises(ValueError):
+        transformer.transform(x.astype(int), inplace=True)
+    with pytest.raises(ValueError):
+        transformer.transform(x, out=np.empty(3))
+
+
+def test_hyperlog_inplace():
+    transformer = HyperlogTransform(t=262144, w=0.5, m=4.5, a=0.0, n_jobs=1)
+    x = np.random.default_rng(42).normal(1000, 5000, 200000)
+    y = transformer.transform(x)
+    data = x.copy()
+    transformer.transform(data, inplace=True)
+    assert np.array_equal(data, y)
+    transformer.inverse_transform(data, inplace=True)
+    assert np.allclose(data, x, atol=1e-6)
+
+
+@pytest.mark.parametrize("group", [AsinhGroup, LogGroup, LogicleGroup])
+def test_float32(group: TestGroup):
+    # float32 mode agrees with the float64 reference values to 1e-6 (scale units) in the forward
+    # direction, and to 1e-4 relative in the inverse, where float32 rounding of the scale value is
+    # amplified by the slope of the inverse
+    for case in group.cases:
+        transformer = group.klass(**case.params, n_jobs=1)
+        y = transformer.transform(group.x.astype(np.float32))
+        assert y.dtype == np.float32
+        assert np.allclose(y, case.y, rtol=0, atol=1e-6)
+        x = transformer.inverse_transform(case.y.astype(np.float32))
+        assert x.dtype == np.float32
+        assert np.allclose(x, group.x, rtol=1e-4, atol=1e-4)
+
+        transformer = group.klass(**case.params, n_jobs=2, dtype="float32")
+        df = transformer.transform(pd.DataFrame({"x1": group.x, "x2": group.x}))
+        assert (df.dtypes == np.float32).all()
+        assert np.allclose(df["x1"], case.y, rtol=0, atol=1e-6)
+        assert transformer.transform(group.x).dtype == np.float32
+
+        transformer = group.klass(**case.params, n_jobs=1, dtype="float64")
+        assert transformer.transform(group.x.astype(np.float32)).dtype == np.float64
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_transform_dataframe_columns(n_jobs: int):
+    case = AsinhGroup.cases[0]
+    x = np.concatenate([AsinhGroup.x for _ in range(2000)])
+    y = np.concatenate([case.y for _ in range(2000)])
+    df = pd.DataFrame({"FSC-A": x, "CD3": x, "Time": np.arange(len(x)), "CD4": x})
+    transformer = AsinhTransform(**case.params, n_jobs=n_jobs)
+
+    transformed = transformer.transform(df, columns=["CD3", "CD4"])
+    assert list(transformed.columns) == list(df.columns)
+    assert np.allclose(transformed["CD3"], y, atol=1e-5)
+    assert np.allclose(transformed["CD4"], y, atol=1e-5)
+    assert np.array_equal(transformed["FSC-A"], x)
+    assert np.array_equal(transformed["Time"], df["Time"])
+    assert np.array_equal(df["CD3"], x)
+
+    assert transformer.transform(df, columns=["CD3"], inplace=True) is df
+    assert np.allclose(df["CD3"], y, atol=1e-5)
+    assert np.array_equal(df["CD4"], x)
+    transformer.inverse_transform(df, columns=["CD3"], inplace=True)
+    assert np.allclose(df["CD3"], x, atol=1e-5)
+
+
+@pytest.mark.parametrize("executor", ["serial", "threads", "processes"])
+@pytest.mark.parametrize("group", [AsinhGroup, LogGroup, LogicleGroup])
+def test_multichannel_transform(executor: str, group: TestGroup):
+    from cytotransform import MultiChannelTransform
+
+    x = np.concatenate([group.x for _ in range(2000)])
+    parameters = {f"ch{i}": case.params for i, case in enumerate(group.cases)}
+    parameters["ch_repeat"] = group.cases[0].params
+    expected = [np.concatenate([case.y for _ in range(2000)]) for case in group.cases]
+    expected.append(expected[0])
+    transformer = MultiChannelTransform(
+        group.klass, parameters, n_jobs=2, executor=executor
+    )
+    assert len(transformer._transformers) == len(group.cases)
+
+    data = np.column_stack([x for _ in parameters])
+    transformed = transformer.transform(data)
+    for j, y in enumerate(expected):
+        assert np.allclose(transformed[:, j], y, atol=1e-5)
+    assert np.allclose(transformer.inverse_transform(transformed), data, atol=1e-5)
+
+    df = pd.DataFrame(data, columns=list(parameters)).assign(Time=np.arange(len(x)))
+    transformed_df = transformer.transform(df)
+    for channel, y in zip(parameters, expected):
+        assert np.allclose(transformed_df[channel], y, atol=1e-5)
+    assert np.array_equal(transformed_df["Time"], df["Time"])
+
+
+def test_transform_iter():
+    case = AsinhGroup.cases[0]
+    transformer = AsinhTransform(**case.params, n_jobs=1)
+    chunks = (AsinhGroup.x[i : i + 3] for i in range(0, len(AsinhGroup.x), 3))
+    assert np.allclose(
+        np.concatenate(list(transformer.transform_iter(chunks))), case.y, atol=1e-5
+    )
+    frames = [pd.DataFrame({"x": case.y}), pd.DataFrame({"x": case.y[::-1]})]
+    inverse = list(transformer.inverse_transform_iter(frames))
+    assert np.allclose(inverse[1]["x"], AsinhGroup.x[::-1], atol=1e-5)
+
+    def failing():
+        yield AsinhGroup.x
+        raise OSError("read failed")
+
+    with pytest.raises(OSError, match="read failed"):
+        list(transformer.transform_iter(failing()))
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_transform_file_npy(tmp_path, n_jobs: int):
+    case = LogicleGroup.cases[0]
+    transformer = LogicleTransform(**case.params, n_jobs=n_jobs)
+    x = np.tile(LogicleGroup.x, (101, 2)).reshape(-1, 4)
+    np.save(tmp_path / "x.npy", x)
+    y = transformer.transform_file(tmp_path / "x.npy", tmp_path / "y.npy", chunk_rows=7)
+    assert np.allclose(np.load(tmp_path / "y.npy"), transformer.transform(x))
+    # arrays, e.g. a memory mapped raw event file, can be transformed in place
+    transformer.inverse_transform_file(y, y, chunk_rows=64)
+    assert np.allclose(y, x, atol=1e-5)
+    with pytest.raises(ValueError, match="different file"):
+        transformer.transform_file(tmp_path / "x.npy", tmp_path / "x.npy")
+
+
+def test_transform_file_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    case = AsinhGroup.cases[0]
+    transformer = AsinhTransform(**case.params, n_jobs=1)
+    x = np.tile(AsinhGroup.x, 50)
+    df = pd.DataFrame({"FSC-A": np.arange(len(x)), "CD3": x, "CD4": x[::-1]})
+    df.to_parquet(tmp_path / "x.parquet", row_group_size=64)
+    transformer.transform_file(
+        tmp_path / "x.parquet",
+        tmp_path / "y.parquet",
+        chunk_rows=100,
+        columns=["CD3", "CD4"],
+    )
+    result = pd.read_parquet(tmp_path / "y.parquet")
+    assert list(result.columns) == list(df.columns)
+    assert np.array_equal(result["FSC-A"], df["FSC-A"])
+    assert np.allclose(result["CD3"], np.tile(case.y, 50), atol=1e-5)
+    assert np.allclose(result["CD4"], np.tile(case.y, 50)[::-1], atol=1e-5)
+
+
+def test_cost_model_plan():
+    model = CostModel()
+    threads, processes = (0.9, 1e-5), (1e-4, 1e-9)
+    assert model.plan(10**4, 8, 4, 1e-9, threads, processes) == Plan("serial", 1)
+    assert model.plan(10**7, 8, 4, 1e-8, threads, processes) == Plan("threads", 4)
+    # functions that hold the GIL run faster in processes once the work is large enough
+    assert model.plan(10**7, 8, 4, 1e-7, (0.25, 1e-5), (1e-4, 1e-10)) == Plan(
+        "processes", 4
+    )
+    assert model.plan(10**7, 8, 4, 1e-8, threads=None) == Plan("serial", 1)
+
+
+def test_cost_model_calibration(tmp_path, monkeypatch):
+    model = CostModel(tmp_path / "cost_model.json")
+    monkeypatch.setattr(cost, "_default_model", model)
+    case = AsinhGroup.cases[0]
+    x = np.concatenate([AsinhGroup.x for _ in range(10000)])
+    with AsinhTransform(**case.params, n_jobs=2, executor="threads") as transformer:
+        assert np.allclose(transformer.transform(x), np.tile(case.y, 10000), atol=1e-5)
+    key = function_key(AsinhPlan(**case.params), np.dtype(np.float64))
+    # each backend of a plan is calibrated separately
+    plans = [LogicleTransform(backend=b).compiled for b in ["numpy", "numba"]]
+    keys = {
+        function_key(f, np.dtype(np.float64)) for p in plans for f in [p, p.inverse]
+    }
+    assert len(keys) == 4
+    assert {"element", "threads_2"} <= set(model.costs["functions"][key])
+    # calibration is saved to disk and reused
+    assert CostModel(model.path).costs == model.costs
+
+    # with costs favouring processes, the auto executor runs batches in processes
+    model.costs["functions"][key].update(element=1e-6, threads_2=0.1)
+    model.costs["overheads"].update(processes_task=1e-5, process_byte=1e-12)
+    with AsinhTransform(**case.params, n_jobs=2) as transformer:
+        assert np.allclose(transformer.transform(x), np.tile(case.y, 10000), atol=1e-5)
+        assert transformer.executor.get("processes")._pool is not None
+
+
+@pytest.mark.parametrize(
+    "transformer",
+    [
+        AsinhTransform(**AsinhGroup.cases[0].params, n_jobs=1),
+        ParametrizedLogTransform(**LogGroup.cases[0].params, n_jobs=1),
+        LogicleTransform(**LogicleGroup.cases[0].params, n_jobs=1, backend="numpy"),
+        HyperlogTransform(n_jobs=1),
+    ],
+)
+def test_compiled_plan(transformer: Transform):
+    plan = transformer.compile()
+    assert plan == transformer.compiled
+    assert hash(plan) == hash(transformer.compiled)
+    assert {plan: 1}[transformer.compile()] == 1
+    with pytest.raises(AttributeError):
+        plan.t = 1
+    x = np.array([1.0, 10.0, 100.0, 500.0, 900.0])
+    y = plan(x)
+    assert np.array_equal(y, transformer.transform(x))
+    assert np.allclose(plan.inverse(y), x)
+    # plans pickle without their tables, which are rebuilt on unpickling
+    restored = pickle.loads(pickle.dumps(plan))
+    assert restored == plan
+    assert np.array_equal(restored(x), y)
+    assert np.array_equal(restored.inverse(y), plan.inverse(y))
+
+
+@pytest.mark.parametrize("group", [AsinhGroup, LogGroup, LogicleGroup])
+def test_numba_backend(group: TestGroup):
+    pytest.importorskip("numba")
+    for case in group.cases:
+        transformer = group.klass(**case.params, n_jobs=-1, backend="numba")
+        assert transformer.compiled.parallel
+        x = np.tile(group.x, 10000)
+        y = np.tile(case.y, 10000)
+        assert np.allclose(transformer.transform(x), y, atol=1e-5)
+        assert np.allclose(transformer.inverse_transform(y), x, atol=1e-5)
+        assert transformer.transform(group.x.astype(np.float32)).dtype == np.float32
+        # in place, over a non-contiguous view
+        data = np.tile(group.x, (2, 2)).T
+        transformer.transform(data, out=data)
+        assert np.allclose(data, np.tile(case.y, (2, 2)).T, atol=1e-5)
+
+
+def test_numba_backend_hyperlog(monkeypatch):
+    pytest.importorskip("numba")
+    x = np.array([-1000.0, -10.0, 0.0, 1.0, 100.0, 1e4, 262144.0, np.nan])
+    reference = HyperlogTransform(n_jobs=1)
+    transformer = HyperlogTransform(n_jobs=1, backend="numba")
+    y = transformer.transform(x)
+    assert np.allclose(y, reference.transform(x), equal_nan=True)
+    assert np.allclose(transformer.inverse_transform(y), x, equal_nan=True)
+    # without numba, transformers fall back to their default backends
+    monkeypatch.setattr(jit, "AVAILABLE", False)
+    assert HyperlogTransform(backend="numba").backend == "numpy"
+    assert not LogicleTransform(backend="numba").compiled.parallel
+
+
+@pytest.mark.parametrize("n_bins,dtype", [(256, np.uint8), (4096, np.uint16)])
+def test_transform_bins(n_bins: int, dtype: type):
+    for group in [AsinhGroup, LogGroup, LogicleGroup]:
+        for case in group.cases:
+            transformer = group.klass(**case.params, n_jobs=1)
+            x = np.append(group.x, np.nan)
+            values = np.nan_to_num(transformer.transform(x), nan=0)
+            y = np.clip(np.floor(values * n_bins), 0, n_bins - 1)
+            bins = transformer.transform(x, output="bins", n_bins=n_bins)
+            assert bins.dtype == dtype
+            assert np.array_equal(bins, y)
+            df = pd.DataFrame({"a": x, "b": x})
+            binned = transformer.transform(df, output="bins", n_bins=n_bins)
+            assert (binned.dtypes == dtype).all()
+            assert np.array_equal(binned["b"], y)
+    with pytest.raises(ValueError):
+        transformer.transform(x, output="bins", n_bins=1 << 17)
+    with pytest.raises(ValueError):
+        transformer.transform(x, output="bins", inplace=True)
+    with pytest.raises(ValueError):
+        transformer.transform(x, output="indices")
+    # bin indices are only written into integer arrays wide enough to hold them
+    out = np.empty(x.shape, dtype=np.int32)
+    transformer.transform(x, output="bins", n_bins=n_bins, out=out)
+    assert np.array_equal(out, y)
+    for wrong in [np.float64, np.int8]:
+        with pytest.raises(ValueError):
+            transformer.transform(
+                x, output="bins", n_bins=n_bins, out=np.empty(x.shape, dtype=wrong)
+            )
+
+
+def test_histogram2d():
+    rng = np.random.default_rng(0)
+    x, y = rng.lognormal(7, 2, (2, 100000)).clip(max=262144)
+    transform_x = LogicleTransform(n_jobs=1)
+    transform_y = AsinhTransform(t=262144, m=4.5, a=0.0, n_jobs=1)
+    counts = histogram2d(x, y, transform_x, transform_y, n_bins=64)
+    expected, _, _ = np.histogram2d(
+        transform_x.transform(x), transform_y.transform(y), bins=64, range=[[0, 1]] * 2
+    )
+    assert counts.shape == (64, 64)
+    assert np.array_equal(counts, expected)
+
+
+@pytest.mark.parametrize("max_error", [1e-4, 1e-7])
+def test_tabulated_transform(max_error: float):
+    rng = np.random.default_rng(0)
+    x = rng.lognormal(7, 2, 100000).clip(max=262144) * rng.choice([-0.01, 1], 100000)
+    x = np.append(x, [np.nan, -1e6, 1e6])
+    exact = HyperlogTransform(n_jobs=1)
+    transformer = TabulatedTransform(exact, max_error=max_error, n_jobs=1)
+    assert transformer.error <= max_error
+    assert transformer.max_abs_error(x) <= max_error * 1.01
+    y = transformer.transform(x)
+    assert np.allclose(y, exact.transform(x), atol=max_error, equal_nan=True)
+    # the inverse is exact, so round trips are within the error bound in scale units
+    assert np.allclose(
+        exact.transform(transformer.inverse_transform(y)),
+        exact.transform(x),
+        atol=max_error,
+        equal_nan=True,
+    )
+    assert transformer.transform(x.astype(np.float32)).dtype == np.float32
+    plan = pickle.loads(pickle.dumps(transformer.compiled))
+    assert plan == transformer.compiled
+    assert np.array_equal(plan(x), y, equal_nan=True)
+    with pytest.raises(ValueError):
+        TabulatedTransform(exact, max_error=0)
+    with pytest.raises(ValueError):
+        TabulatedTransform(exact, max_error=1e-15)
+
+
+@pytest.mark.parametrize("backend", ["native", "numpy", "numba"])
+def test_logicle_out_of_range(backend: str):
+    if backend == "native":
+        pytest.importorskip("logicle_ext")
+    if backend == "numba":
+        pytest.importorskip("numba")
+    x = np.array([-1e6, -10.0, 0.0, 1000.0, 262144.0, 1e7, np.nan])
+    inside = [False, True, True, True, True, False, True]
+    scales = np.array([-0.5, 0.0, 0.5, 1.0, 1.5, np.nan])
+    clip = LogicleTransform(n_jobs=1, backend=backend)
+    y, count = clip.compiled.counted(x)
+    assert count == 2
+    assert np.array_equal(y[[0, 5]], [0.0, 1.0]) and np.isnan(y[-1])
+    assert np.array_equal(clip.inverse_transform(scales)[[0, 4]], clip.compiled.bounds)
+    nan = LogicleTransform(n_jobs=1, backend=backend, out_of_range="nan")
+    assert np.array_equal(np.isnan(nan.transform(x)), ~np.array(inside) | np.isnan(x))
+    assert np.array_equal(nan.transform(x)[inside], y[inside], equal_nan=True)
+    assert np.isnan(nan.inverse_transform(scales)[[0, 4, 5]]).all()
+    extrapolate = LogicleTransform(
+        n_jobs=1, backend=backend, out_of_range="extrapolate"
+    )
+    exact = _logicle_exact(logicle_coefficients(262144, 0.5, 4.5, 0.0), x)
+    assert np.allclose(extrapolate.transform(x), exact, atol=1e-6, equal_nan=True)
+    assert np.allclose(
+        extrapolate.inverse_transform(exact[[0, 5]]), x[[0, 5]], rtol=1e-6
+    )
+    with pytest.raises(ValueError):
+        LogicleTransform(out_of_range="raise")
+
+
+@pytest.mark.parametrize("executor", ["serial", "threads", "processes"])
+def test_transform_pipeline(executor: str):
+    rng = np.random.default_rng(0)
+    spillover = np.eye(3) + rng.uniform(0, 0.1, (3, 3)) * (1 - np.eye(3))
+    x = rng.lognormal(7, 2, (50000, 3))
+    transforms = [LogicleTransform(n_jobs=1), None, AsinhTransform(n_jobs=1)]
+    pipeline = TransformPipeline(
+        transforms,
+        spillover=spillover,
+        scale=[4096, 1, 100],
+        offset=1.0,
+        n_jobs=2,
+        executor=executor,
+    )
+    compensated = x @ np.linalg.inv(spillover)
+    expected = (
+        np.column_stack(
+            [
+                compensated[:, i] if t is None else t.transform(compensated[:, i])
+                for i, t in enumerate(transforms)
+            ]
+        )
+        * [4096, 1, 100]
+        + 1.0
+    )
+    y = pipeline.transform(x)
+    assert np.allclose(y, expected)
+    assert np.allclose(pipeline.transform(pipeline.inverse_transform(y)), y)
+    df = pd.DataFrame(x, columns=["CD3", "FSC", "CD4"])
+    by_name = TransformPipeline(
+        dict(zip(df.columns, transforms)), spillover=spillover, n_jobs=1
+    )
+    assert np.allclose(by_name.transform(df)["CD3"], expected[:, 0] / 4096 - 1 / 4096)
+    plan = pickle.loads(pickle.dumps(pipeline.compiled))
+    assert plan == pipeline.compiled
+    assert np.array_equal(plan(x), y)
+    with pytest.raises(ValueError):
+        TransformPipeline(transforms, spillover=np.ones((3, 3)))
+    with pytest.raises(ValueError):
+        TransformPipeline(transforms, scale=0)
+    # a single transform for every channel needs to be told how many channels there are
+    with pytest.raises(ValueError):
+        TransformPipeline(AsinhTransform())
+
+
+def test_transform_pipeline_plan(tmp_path, monkeypatch, request):
+    model = CostModel(tmp_path / "cost_model.json")
+    monkeypatch.setattr(cost, "_default_model", model)
+    # the channels' native plans thread internally on their own, and run single threaded in blocks
+    transforms = [LogicleTransform(n_jobs=4) for _ in range(4)]
+    assert transforms[0].compiled.parallel
+    pipeline = TransformPipeline(transforms, n_jobs=4, executor="threads")
+    request.addfinalizer(pipeline.close)
+    assert not any(plan.parallel for plan in pipeline.compiled.plans)
+    key = function_key(pipeline.compiled.plans[0], np.dtype(np.float64))
+    model.costs["functions"][key] = {"element": 1e-7, "threads_4": 0.9}
+    model.costs.setdefault("overheads", {})["threads_task"] = 1e-6
+    x = np.random.default_rng(0).lognormal(7, 2, (1 << 18, 4))
+    with pipeline.profile() as profiler:
+        y = pipeline.transform(x)
+    (stats,) = profiler.calls
+    assert stats.executor == "threads" and stats.n_batches > 1
+    # binned output is planned as the forward transform it bins
+    choose_plan, planned = pipeline._choose_plan, []
+    monkeypatch.setattr(
+        pipeline,
+        "_choose_plan",
+        lambda data, func, dtype, inverse: planned.append(inverse)
+        or choose_plan(data, func, dtype, inverse),
+    )
+    pipeline.transform(x, output="bins")
+    pipeline.inverse_transform(y)
+    assert planned == [False, True]
+    assert np.array_equal(
+        y, np.column_stack([t.transform(x[:, i]) for i, t in enumerate(transforms)])
+    )
+
+
+@pytest.mark.parametrize("executor", ["threads", "processes"])
+def test_profile(executor: str, monkeypatch, request):
+    x = np.random.default_rng(0).lognormal(7, 2, (100000, 2))
+    transformer = AsinhTransform(executor=executor, n_jobs=2)
+    request.addfinalizer(transformer.close)
+    monkeypatch.setattr(
+        transformer,
+        "_choose_plan",
+        lambda data, *args: (transformer.executor, transformer._batches(data, 4)),
+    )
+    exported = []
+    with transformer.profile(callback=exported.append) as profiler:
+        y = transformer.transform(x)
+        transformer.inverse_transform(pd.DataFrame(y), columns=[0])
+    transformer.transform(x)
+    assert profiler.calls == exported and len(exported) == 2
+    array, frame = exported
+    assert (array.method, array.input, array.n_events) == ("transform", "array", 100000)
+    assert (array.executor, array.n_workers, array.n_batches) == (executor, 2, 4)
+    assert 0 < array.worker_utilization <= 1
+    assert array.phases["compute"] <= array.wall_time
+    copied = 3 * x.nbytes if executor == "processes" else 0
+    assert array.bytes_copied == copied
+    assert (frame.method, frame.input, frame.n_values) == (
+        "inverse_transform",
+        "dataframe",
+        100000,
+    )
+    assert {"extract", "plan", "compute", "assemble"} <= set(frame.phases)
+    stats = array.as_dict()
+    assert stats["phase_extract"] == 0.0 and stats["events_per_second"] > 0
+    summary = profiler.summary()
+    assert summary["n_calls"] == 2 and summary["n_events"] == 200000
+    assert transformer.profiler is None
+    shared = Profiler(keep=False)
+    transformer.profiler = shared
+    transformer.transform(x)
+    assert shared.calls == []
+
+
+def test_transform_async(monkeypatch):
+    rng = np.random.default_rng(0)
+    transformers = [LogicleTransform(), LogicleTransform()]
+    batches = []
+    run_batch = aio._run_batch
+    monkeypatch.setattr(
+        aio,
+        "_run_batch",
+        lambda *args: batches.append(len(args[3])) or run_batch(*args),
+    )
+    monkeypatch.setattr(aio, "MAX_PENDING", 8)
+    requests = [rng.normal(0, 1000, (100, 3)) for _ in range(50)]
+
+    async def main():
+        results = await asyncio.gather(
+            *(transformers[i % 2].transform_async(x) for i, x in enumerate(requests))
+        )
+        inverse = await transformers[0].inverse_transform_async(results[0])
+        bins = await transformers[0].transform_async(requests[0], output="bins")
+        frame = await transformers[0].transform_async(
+            pd.DataFrame(requests[0]), columns=[0]
+        )
+        with pytest.raises(ValueError):
+            await transformers[0].transform_async(requests[0], output="levels")
+        return results, inverse, bins, frame
+
+    results, inverse, bins, frame = asyncio.run(main())
+    for x, y in zip(requests, results):
+        np.testing.assert_array_equal(y, transformers[0].transform(x))
+    np.testing.assert_array_equal(
+        inverse, transformers[0].inverse_transform(results[0])
+    )
+    np.testing.assert_array_equal(
+        bins, transformers[0].transform(requests[0], output="bins")
+    )
+    pd.testing.assert_frame_equal(
+        frame, transformers[0].transform(pd.DataFrame(requests[0]), columns=[0])
+    )
+    # equal plans share batches, so at most MAX_PENDING requests are transformed per call
+    assert sum(batches[:-2]) == 50 and len(batches) < 50
+    assert max(batches) <= 8
+
+    # inverse requests to equal transformers share batches too
+    batches.clear()
+
+    async def inverse_requests():
+        return await asyncio.gather(
+            *(
+                transformers[i % 2].inverse_transform_async(y)
+                for i, y in enumerate(results[:8])
+            )
+        )
+
+    for y, x in zip(results, asyncio.run(inverse_requests())):
+        np.testing.assert_array_equal(x, transformers[0].inverse_transform(y))
+    assert batches == [8]
+
+    # a request that cannot be transformed fails on its own, not the batch it was coalesced into
+    async def with_bad_request():
+        bad = np.array([1.0, "x", 3.0], dtype=object)
+        calls = [
+            transformers[0].transform_async(x) for x in [requests[0], bad, requests[1]]
+        ]
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    good, error, other = asyncio.run(with_bad_request())
+    assert isinstance(error, ValueError)
+    np.testing.assert_array_equal(good, results[0])
+    np.testing.assert_array_equal(other, results[1])
+
+
+def write_fcs(path, columns, names, datatype="F", byte_order="1,2,3,4", ranges=None):
+    """
+    Minimal FCS 3.1 writer, with the DATA offsets given only in TEXT as for large files.
+    """
+    order = "<" if byte_order.startswith("1") else ">"
+    row = np.dtype(
+        [(f"P{i}", c.dtype.newbyteorder(order)) for i, c in enumerate(columns, 1)]
+    )
+    records = np.empty(len(columns[0]), dtype=row)
+    for i, column in enumerate(columns, 1):
+        records[f"P{i}"] = column
+    keywords = {
+        "$BYTEORD": byte_order,
+        "$DATATYPE": datatype,
+        "$MODE": "L",
+        "$PAR": str(len(columns)),
+        "$TOT": str(len(records)),
+    }
+    for i, (column, name) in enumerate(zip(columns, names), 1):
+        keywords[f"$P{i}N"] = name.replace("/", "//")
+        keywords[f"$P{i}B"] = str(column.dtype.itemsize * 8)
+        keywords[f"$P{i}R"] = str(ranges[i - 1] if ranges else 262144)
+    begin = 1024
+    keywords["$BEGINDATA"], keywords["$ENDDATA"] = str(begin), str(
+        begin + records.nbytes - 1
+    )
+    text = "/" + "".join(f"{key}/{value}/" for key, value in keywords.items())
+    header = b"FCS3.1    " + b"".join(
+        str(offset).rjust(8).encode() for offset in [58, 58 + len(text) - 1, 0, 0, 0, 0]
+    )
+    with open(path, "wb") as f:
+        f.write((header + text.encode()).ljust(begin) + records.tobytes())
+
+
+def test_fcs_file(tmp_path):
+    rng = np.random.default_rng(0)
+    x = rng.lognormal(7, 2, (5000, 3)).astype(np.float32)
+    names = ["FSC-A", "CD3/FITC", "CD4"]
+    write_fcs(tmp_path / "float.fcs", list(x.T), names, byte_order="4,3,2,1")
+    fcs = FCSFile(tmp_path / "float.fcs")
+    assert fcs.channels == names and fcs.shape == (5000, 3)
+    # the events are a view of the file as stored
+    assert isinstance(fcs.data, np.memmap) and fcs.data.dtype == np.dtype(">f4")
+    assert np.array_equal(fcs.data, x) and fcs.dtype == np.float32
+    transformer = LogicleTransform(n_jobs=1)
+    y = transformer.transform(fcs, columns=["CD3/FITC", "CD4"])
+    assert y.dtype == np.float32 and np.array_equal(y[:, 0], x[:, 0])
+    assert np.array_equal(y[:, 1:], transformer.transform(x[:, 1:]))
+    assert np.array_equal(transformer.transform(fcs), transformer.transform(x))
+    bins = transformer.transform(fcs, output="bins")
+    assert np.array_equal(bins, transformer.transform(x, output="bins"))
+    # bins of selected channels are returned on their own, not mixed with the float events
+    bins = transformer.transform(fcs, columns=["CD4", "CD3/FITC"], output="bins")
+    assert bins.dtype == np.uint8 and bins.shape == (5000, 2)
+    assert np.array_equal(bins, transformer.transform(x[:, [2, 1]], output="bins"))
+    with pytest.raises(ValueError):
+        transformer.transform(fcs, output="bins", out=np.empty(x.shape))
+    dst = transformer.transform_file(fcs, tmp_path / "out.npy", chunk_rows=1000)
+    assert np.array_equal(dst, transformer.transform(x))
+    multichannel = MultiChannelTransform(
+        LogicleTransform, {"CD4": {"w": 1.0}, "CD3/FITC": {}}, n_jobs=1
+    )
+    expected = multichannel.transform(pd.DataFrame(x, columns=names))
+    assert np.array_equal(multichannel.transform(fcs), expected.to_numpy())
+
+    counts = rng.integers(0, 1 << 16, 5000).astype(np.uint16)
+    wide = rng.integers(0, 1 << 20, 5000).astype(np.uint32)
+    write_fcs(tmp_path / "int.fcs", [counts, wide], ["a", "b"], "I", ranges=[1024, 1e6])
+    fcs = FCSFile(tmp_path / "int.fcs")
+    assert fcs.data.dtype.names == ("P1", "P2") and fcs.dtype == np.uint32
+    # values are masked to a power of two $PnR
+    assert np.array_equal(
+        fcs.read(channels=["a", 1]), np.column_stack([counts & 1023, wide])
+    )
+    dst = transformer.transform_file(
+        tmp_path / "int.fcs", tmp_path / "int.npy", chunk_rows=999, columns=["b"]
+    )
+    assert dst.dtype == np.float64 and np.array_equal(dst[:, 0], counts & 1023)
+    assert np.array_equal(dst[:, 1], transformer.transform(wide.astype(np.float64)))
+    with pytest.raises(KeyError):
+        transformer.transform(fcs, columns=["c"])
+    with pytest.raises(ValueError):
+        transformer.transform(fcs, inplace=True)
+    write_fcs(tmp_path / "ascii.fcs", [counts], ["a"], "A")
+    with pytest.raises(ValueError):
+        FCSFile(tmp_path / "ascii.fcs")
+    with pytest.raises(ValueError):
+        FCSFile(tmp_path / "out.npy")
+
+
+@pytest.mark.parametrize("executor", ["serial", "threads", "processes"])
+def test_transform_many(executor: str, tmp_path, monkeypatch, request):
+    rng = np.random.default_rng(0)
+    transformer = LogicleTransform(executor=executor, n_jobs=2)
+    request.addfinalizer(transformer.close)
+    # units of a few thousand values, so that samples are split between workers
+    monkeypatch.setattr("cytotransform.scheduler.UNIT_VALUES", 4096)
+    arrays = [rng.normal(0, 1000, (n, 3)) for n in [10, 20000, 0, 3000]]
+    frame = pd.DataFrame(arrays[1], columns=["FSC-A", "CD3", "CD4"])
+    np.save(tmp_path / "sample.npy", arrays[3])
+    events = arrays[1].astype(np.float32)
+    write_fcs(tmp_path / "sample.fcs", list(events.T), ["FSC-A", "CD3", "CD4"])
+    sources = [*arrays, tmp_path / "sample.npy", tmp_path / "sample.fcs"]
+    results = dict(transformer.transform_many(sources, max_samples=2))
+    assert sorted(results) == list(range(6))
+    for i, x in enumerate(arrays + [arrays[3], events]):
+        assert np.array_equal(results[i], transformer.transform(x))
+    frames = dict(
+        transformer.transform_many(
+            [frame, tmp_path / "sample.fcs"], columns=["CD3", "CD4"]
+        )
+    )
+    pd.testing.assert_frame_equal(
+        frames[0], transformer.transform(frame, columns=["CD3", "CD4"])
+    )
+    expected = transformer.transform(
+        pd.DataFrame(events, columns=frame.columns), columns=["CD3", "CD4"]
+    )
+    assert np.array_equal(frames[1], expected.to_numpy())
+    ((_, bins),) = transformer.transform_many([arrays[1]], output="bins")
+    assert np.array_equal(bins, transformer.transform(arrays[1], output="bins"))
+    # bins of selected FCS channels are returned on their own, not written into the float events
+    ((_, bins),) = transformer.transform_many(
+        [tmp_path / "sample.fcs"], columns=["CD3", "CD4"], output="bins"
+    )
+    assert bins.dtype == np.uint8
+    assert np.array_equal(bins, transformer.transform(events[:, 1:], output="bins"))
+    ((_, inverse),) = transformer.inverse_transform_many([results[1]])
+    assert np.array_equal(inverse, transformer.inverse_transform(results[1]))
+    multichannel = MultiChannelTransform(
+        LogicleTransform, {"CD3": {"w": 1.0}, "CD4": {}}, executor=executor, n_jobs=2
+    )
+    request.addfinalizer(multichannel.close)
+    ((_, y),) = multichannel.transform_many([frame])
+    pd.testing.assert_frame_equal(y, multichannel.transform(frame))
+    with pytest.raises(TypeError):
+        list(transformer.transform_many(arrays, columns=["CD3"]))
+
+
+def test_from_data(tmp_path):
+    rng = np.random.default_rng(0)
+    x = np.concatenate([rng.normal(0, 300, 20000), rng.lognormal(8, 1.5, 30000)])
+    r, top = np.quantile(x[x < 0], 0.05), x.max()
+    sketch = QuantileSketch()
+    sketch.update(x)
+    assert sketch.count[0] == len(x) and sketch.max[0] == top
+    for q in [0.01, 0.5, 0.99]:
+        assert sketch.quantile(q)[0] == pytest.approx(np.quantile(x, q), rel=0.02)
+    assert sketch.quantile(0.05, negative=True)[0] == pytest.approx(r, rel=0.02)
+    # sketches of parts of the data merge into the sketch of all of it
+    merged = QuantileSketch()
+    for part in np.array_split(x, 3):
+        other = QuantileSketch()
+        other.update(part)
+        merged.merge(other)
+    assert np.array_equal(merged.counts, sketch.counts)
+
+    logicle = LogicleTransform.from_data(x, n_jobs=1)
+    assert isinstance(logicle, LogicleTransform)
+    assert logicle.parameters["t"] == top
+    w = (4.5 - np.log10(top / -r)) / 2
+    assert logicle.parameters["w"] == pytest.approx(w, abs=0.01)
+    # the estimated scale reaches down to the negative percentile
+    assert HyperlogTransform.from_data(x).parameters["w_"] == logicle.parameters["w"]
+    asinh = AsinhTransform.from_data(x)
+    assert asinh.transform(np.array([r]))[0] == pytest.approx(0, abs=0.01)
+
+    frame = pd.DataFrame({"CD3": x, "CD4": 2 * x, "FSC-A": np.abs(x)})
+    multichannel = LogicleTransform.from_data(frame, n_jobs=1, dtype="float32")
+    assert isinstance(multichannel, MultiChannelTransform)
+    assert multichannel.channels == ["CD3", "CD4", "FSC-A"]
+    parameters = [t.parameters for t in multichannel._channel_transformers()]
+    assert parameters[0] == logicle.parameters and parameters[2]["w"] == 0
+    assert multichannel.transform(frame).dtypes.tolist() == [np.float32] * 3
+    # chunks of the data, read one at a time, give the same estimates
+    chunked = LogicleTransform.from_data(
+        (frame.iloc[i : i + 7000] for i in range(0, len(frame), 7000)), n_jobs=1
+    )
+    assert [t.parameters for t in chunked._channel_transformers()] == parameters
+    # DataFrame columns are given by label or position
+    by_position = LogicleTransform.from_data(frame, columns=[2, "CD3"], n_jobs=1)
+    assert by_position.channels == ["FSC-A", "CD3"]
+    assert [t.parameters for t in by_position._channel_transformers()] == [
+        parameters[2],
+        parameters[0],
+    ]
+    write_fcs(
+        tmp_path / "sample.fcs", list(frame.to_numpy().T), list(frame.columns), "D"
+    )
+    fcs = LogicleTransform.from_data(
+        tmp_path / "sample.fcs", columns=["CD3"], chunk_rows=999, n_jobs=1
+    )
+    assert fcs.channels == ["CD3"]
+    assert fcs._channel_transformers()[0].parameters["w"] == pytest.approx(w, abs=0.01)
+    assert HyperlogTransform.from_data(np.abs(x)).parameters["w_"] == MIN_W
+    with pytest.raises(ValueError):
+        LogicleTransform.from_data(-np.abs(x))
+
+
+def test_lazy_import():
+    # a fresh interpreter, as this one has imported everything already
+    code = (
+        "import sys, cytotransform; cytotransform.AsinhTransform(n_jobs=-1);"
+        "print(' '.join(sorted(sys.modules)))"
+    )
+    modules = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout.split()
+    for heavy in [
+        "pandas",
+        "joblib",
+        "scipy",
+        "numba",
+        "logicle_ext",
+        "cytotransform.logicle",
+    ]:
+        assert heavy not in modules
+    import cytotransform
+
+    assert "FCSFile" in dir(cytotransform)
+    with pytest.raises(AttributeError):
+        cytotransform.NoSuchTransform